@@ -0,0 +1,119 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Type
+import hashlib
+import os
+
+import pandas as pd  # type: ignore
+
+from app.utils.log import Log
+
+CHUNK_SIZE = 1 << 20
+
+
+def fingerprint(path: str) -> str:
+    """
+    Content fingerprint of a file, used as the cache key of the tables
+    parsed from it.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as arq:
+        for bloco in iter(lambda: arq.read(CHUNK_SIZE), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class CachedRelato:
+    """
+    Stand-in for `idecomp.decomp.relato.Relato` built from the cached
+    tables, exposing only the properties used by the service.
+    """
+
+    TABLES = ["dados_mercado", "energia_armazenada_maxima_submercado"]
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]):
+        self.__tables = tables
+
+    @property
+    def dados_mercado(self) -> pd.DataFrame:
+        return self.__tables["dados_mercado"]
+
+    @property
+    def energia_armazenada_maxima_submercado(self) -> pd.DataFrame:
+        return self.__tables["energia_armazenada_maxima_submercado"]
+
+
+class AbstractCacheRepository(ABC):
+    @abstractmethod
+    def get(self, key: str, table: str) -> Optional[pd.DataFrame]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, key: str, table: str, df: pd.DataFrame):
+        raise NotImplementedError
+
+
+class ParquetCacheRepository(AbstractCacheRepository):
+    """
+    On-disk cache of parsed tables stored as Parquet files, keyed by
+    the fingerprint of the source file. The least recently used
+    entries are evicted when the cache exceeds its maximum size.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.__directory = Path(directory)
+        self.__max_size = max_size
+
+    def __path(self, key: str, table: str) -> Path:
+        return self.__directory.joinpath(key[:2], f"{key}.{table}.parquet")
+
+    def get(self, key: str, table: str) -> Optional[pd.DataFrame]:
+        caminho = self.__path(key, table)
+        try:
+            df = pd.read_parquet(caminho)
+            os.utime(caminho)
+            return df
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            Log.log().warning(f"Erro na leitura do cache {caminho}: {e}")
+            return None
+
+    def put(self, key: str, table: str, df: pd.DataFrame):
+        caminho = self.__path(key, table)
+        try:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = caminho.with_suffix(f".{os.getpid()}.tmp")
+            df.to_parquet(temporario)
+            os.replace(temporario, caminho)
+            self.__evict()
+        except Exception as e:
+            Log.log().warning(f"Erro na escrita do cache {caminho}: {e}")
+
+    def __evict(self):
+        entradas = []
+        total = 0
+        for arq in self.__directory.glob("*/*.parquet"):
+            try:
+                st = arq.stat()
+            except FileNotFoundError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, arq))
+            total += st.st_size
+        if total <= self.__max_size:
+            return
+        for _, tamanho, arq in sorted(entradas):
+            if total <= self.__max_size:
+                break
+            try:
+                arq.unlink()
+                total -= tamanho
+            except FileNotFoundError:
+                pass
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractCacheRepository:
+    mapping: Dict[str, Type[AbstractCacheRepository]] = {
+        "PARQUET": ParquetCacheRepository
+    }
+    return mapping.get(kind, ParquetCacheRepository)(*args, **kwargs)
@@ -0,0 +1,136 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Type
+
+import pyarrow as pa  # type: ignore
+import pyarrow.parquet as pq  # type: ignore
+
+from app.adapters.violationrepository import AbstractViolationRepository
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.models.inviabilidade import Inviabilidade
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+VIOLATIONS_SCHEMA = pa.schema(
+    [
+        ("tipo", pa.string()),
+        ("iteracao", pa.int64()),
+        ("estagio", pa.int64()),
+        ("cenario", pa.int64()),
+        ("codigo", pa.int64()),
+        ("patamar", pa.int64()),
+        ("limite", pa.string()),
+        ("subsistema", pa.string()),
+        ("restricao", pa.string()),
+        ("violacao", pa.float64()),
+        ("unidade", pa.string()),
+    ]
+)
+
+RESULTS_SCHEMA = pa.schema(
+    [
+        ("flexType", pa.string()),
+        ("flexStage", pa.int64()),
+        ("flexCode", pa.int64()),
+        ("flexPatamar", pa.string()),
+        ("flexLimit", pa.string()),
+        ("flexSubsystem", pa.string()),
+        ("flexAmount", pa.float64()),
+    ]
+)
+
+
+def violations_table(inviabilidades: List[Inviabilidade]) -> pa.Table:
+    nomes = AbstractViolationRepository.nomes_inviabilidades
+    return pa.Table.from_pydict(
+        {
+            "tipo": [nomes[type(i)] for i in inviabilidades],
+            "iteracao": [i._iteracao for i in inviabilidades],
+            "estagio": [i._estagio for i in inviabilidades],
+            "cenario": [i._cenario for i in inviabilidades],
+            "codigo": [getattr(i, "_codigo", None) for i in inviabilidades],
+            "patamar": [getattr(i, "_patamar", None) for i in inviabilidades],
+            "limite": [getattr(i, "_limite", None) for i in inviabilidades],
+            "subsistema": [
+                getattr(i, "_subsistema", None) for i in inviabilidades
+            ],
+            "restricao": [i._mensagem_restricao for i in inviabilidades],
+            "violacao": [i._violacao for i in inviabilidades],
+            "unidade": [i._unidade for i in inviabilidades],
+        },
+        schema=VIOLATIONS_SCHEMA,
+    )
+
+
+def results_table(results: List[FlexibilizationRecord]) -> pa.Table:
+    return pa.Table.from_pydict(
+        {
+            "flexType": [r.flexType for r in results],
+            "flexStage": [r.flexStage for r in results],
+            "flexCode": [r.flexCode for r in results],
+            "flexPatamar": [
+                str(r.flexPatamar) if r.flexPatamar is not None else None
+                for r in results
+            ],
+            "flexLimit": [r.flexLimit for r in results],
+            "flexSubsystem": [r.flexSubsystem for r in results],
+            "flexAmount": [r.flexAmount for r in results],
+        },
+        schema=RESULTS_SCHEMA,
+    )
+
+
+def results_arrow_stream(results: List[FlexibilizationRecord]) -> bytes:
+    """
+    Serializes the results as an Arrow IPC stream, for clients that
+    request `application/vnd.apache.arrow.stream`.
+    """
+    tabela = results_table(results)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+    return sink.getvalue().to_pybytes()
+
+
+class AbstractExportRepository(ABC):
+    @abstractmethod
+    def export(
+        self,
+        inviabilidades: List[Inviabilidade],
+        results: List[FlexibilizationRecord],
+    ):
+        raise NotImplementedError
+
+
+class ParquetExportRepository(AbstractExportRepository):
+    """
+    Writes the classified violations and the flexibilization results
+    of each round as Parquet files in a directory inside the case.
+    """
+
+    def __init__(self, path: str, directory: str):
+        self.__directory = Path(path).joinpath(directory)
+
+    def export(
+        self,
+        inviabilidades: List[Inviabilidade],
+        results: List[FlexibilizationRecord],
+    ):
+        self.__directory.mkdir(parents=True, exist_ok=True)
+        instante = datetime.now().strftime("%Y%m%dT%H%M%S")
+        pq.write_table(
+            violations_table(inviabilidades),
+            str(self.__directory.joinpath(f"violacoes_{instante}.parquet")),
+        )
+        pq.write_table(
+            results_table(results),
+            str(self.__directory.joinpath(f"resultados_{instante}.parquet")),
+        )
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractExportRepository:
+    mapping: Dict[str, Type[AbstractExportRepository]] = {
+        "PARQUET": ParquetExportRepository
+    }
+    return mapping.get(kind, ParquetExportRepository)(*args, **kwargs)
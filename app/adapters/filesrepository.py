@@ -1,19 +1,49 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Type, Union
+from typing import Dict, List, Optional, Tuple, Type, Union
+import asyncio
+import os
 import pathlib
+import shutil
 from os.path import join
+import orjson
+import pandas as pd  # type: ignore
 
 from idecomp.decomp.caso import Caso
 from idecomp.decomp.arquivos import Arquivos
 from idecomp.decomp.dadger import Dadger
 from idecomp.decomp.inviabunic import InviabUnic
 from idecomp.decomp.relato import Relato
-from idecomp.decomp.hidr import Hidr
 
 from app.internal.settings import Settings
+from app.models.dadgerdiff import DadgerDiffRecord
+from app.models.dadgerpatch import DADGER_PATCH_VERSION, DadgerPatch
+from app.internal.serialization import dadger_patch_json
+from app.internal.fs import (
+    FileState,
+    file_state,
+    restore,
+    same_content,
+    snapshot,
+    unchanged,
+)
 from app.utils.encoding import converte_codificacao
+from app.utils.dadgerpatch import (
+    DadgerPatcher,
+    aplica_mudancas,
+    diferencas_dadger,
+)
+from app.utils.inviabunic import le_inviabilidades_simulacao_final
+from app.utils.hidr import HidrMemmap
 from app.utils.log import Log
 from app.internal.httpresponse import HTTPResponse
+from app.adapters.cacherepository import (
+    AbstractCacheRepository,
+    CachedRelato,
+    fingerprint,
+)
+from app.adapters.cacherepository import factory as cache_factory
+from app.adapters.sessionrepository import CaseSession
+from app.adapters.sessionrepository import factory as session_factory
 
 
 class AbstractFilesRepository(ABC):
@@ -35,22 +65,88 @@ class AbstractFilesRepository(ABC):
     def set_dadger(self, d: Dadger) -> HTTPResponse:
         raise NotImplementedError
 
+    @abstractmethod
+    def rollback_dadger(self) -> HTTPResponse:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def dadger_state(self) -> Optional[FileState]:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def dadger_patcher(self) -> Optional[DadgerPatcher]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def adopt_dadger(
+        self,
+        d: Dadger,
+        patcher: Optional[DadgerPatcher],
+        state: FileState,
+    ) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_dadger_patch(self) -> Union[DadgerPatch, HTTPResponse]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def apply_dadger_patch(self, patch: DadgerPatch) -> HTTPResponse:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_variant(
+        self,
+        directory: str,
+        d: Dadger,
+        patcher: Optional[DadgerPatcher] = None,
+    ) -> HTTPResponse:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def inviabunic_path(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_dadger_diff(
+        self, d: Dadger
+    ) -> Union[List[DadgerDiffRecord], HTTPResponse]:
+        raise NotImplementedError
+
     @abstractmethod
     def get_inviabunic(self) -> Union[InviabUnic, HTTPResponse]:
         raise NotImplementedError
 
     @abstractmethod
-    def get_relato(self) -> Union[Relato, HTTPResponse]:
+    def get_inviabilidades_simulacao_final(
+        self,
+    ) -> Union[pd.DataFrame, HTTPResponse]:
         raise NotImplementedError
 
     @abstractmethod
-    def get_hidr(self) -> Union[Hidr, HTTPResponse]:
+    def get_relato(self) -> Union[Relato, CachedRelato, HTTPResponse]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_hidr(self) -> Union[HidrMemmap, HTTPResponse]:
         raise NotImplementedError
 
 
 class RawFilesRepository(AbstractFilesRepository):
-    def __init__(self, path: str):
+    def __init__(self, path: str, read_only: bool = False):
         self.__path = path
+        self.__read_only = read_only
+        self.__cache: Optional[AbstractCacheRepository] = None
+        if Settings.cache_directory:
+            self.__cache = cache_factory(
+                "PARQUET", Settings.cache_directory, Settings.cache_max_size
+            )
+        self.__sessions = session_factory(
+            "MEMORY", Settings.session_max_cases, Settings.session_max_bytes
+        )
         try:
             self.__caso = Caso.read(join(str(self.__path), "caso.dat"))
         except FileNotFoundError:
@@ -62,15 +158,22 @@ class RawFilesRepository(AbstractFilesRepository):
             code=404, detail=""
         )
         self.__read_dadger = False
-        self.__relato: Union[Relato, HTTPResponse] = HTTPResponse(
-            code=404, detail=""
+        self.__patcher: Optional[DadgerPatcher] = None
+        self.__dadger_state: Optional[FileState] = None
+        self.__snapshot_dadger: Optional[Tuple[str, str]] = None
+        self.__relato: Union[Relato, CachedRelato, HTTPResponse] = (
+            HTTPResponse(code=404, detail="")
         )
         self.__read_relato = False
         self.__inviabunic: Union[InviabUnic, HTTPResponse] = HTTPResponse(
             code=404, detail=""
         )
         self.__read_inviabunic = False
-        self.__hidr: Union[Hidr, HTTPResponse] = HTTPResponse(
+        self.__inviabilidades: Union[pd.DataFrame, HTTPResponse] = (
+            HTTPResponse(code=404, detail="")
+        )
+        self.__read_inviabilidades = False
+        self.__hidr: Union[HidrMemmap, HTTPResponse] = HTTPResponse(
             code=404, detail=""
         )
         self.__read_hidr = False
@@ -103,14 +206,25 @@ class RawFilesRepository(AbstractFilesRepository):
                 if not arq_dadger:
                     raise FileNotFoundError()
                 caminho = str(pathlib.Path(self.__path).joinpath(arq_dadger))
-                script = str(
-                    pathlib.Path(Settings.installdir).joinpath(
-                        Settings.encoding_script
-                    )
+                # O dadger escrito na rodada anterior é reaproveitado,
+                # se o arquivo não foi alterado desde então. Simulações
+                # alterariam o objeto sem escrevê-lo, e não o utilizam.
+                sessao = (
+                    self.__sessions.pop(caminho)
+                    if not self.__read_only
+                    else None
                 )
-                await converte_codificacao(caminho, script)
+                if sessao is not None:
+                    Log.log().info(f"Arquivo {arq_dadger} obtido da sessão")
+                    self.__dadger = sessao.dadger
+                    self.__patcher = sessao.patcher
+                    self.__dadger_state = sessao.state
+                    return self.__dadger
+                await self.__converte(caminho)
                 Log.log().info(f"Lendo arquivo {arq_dadger}")
-                self.__dadger = Dadger.read(join(self.__path, arq_dadger))
+                self.__dadger = await asyncio.to_thread(
+                    self.__read_dadger_file, caminho
+                )
             except FileNotFoundError:
                 msg = "Não foi encontrado o arquivo dadger"
                 return HTTPResponse(code=404, detail=msg)
@@ -119,7 +233,164 @@ class RawFilesRepository(AbstractFilesRepository):
                 return HTTPResponse(code=500, detail=str(e))
         return self.__dadger
 
+    async def __converte(self, caminho: str):
+        # A conversão reescreve o arquivo, o que não é permitido em modo
+        # somente leitura
+        if self.__read_only:
+            return
+        script = str(
+            pathlib.Path(Settings.installdir).joinpath(
+                Settings.encoding_script
+            )
+        )
+        await converte_codificacao(caminho, script)
+
+    def __read_dadger_file(self, caminho: str) -> Dadger:
+        self.__dadger_state = file_state(caminho)
+        if Settings.dadger_patch or self.__read_only:
+            try:
+                patcher = DadgerPatcher(caminho)
+                dadger = patcher.le()
+                self.__patcher = patcher
+                return dadger
+            except ValueError as e:
+                Log.log().warning(f"Lendo dadger completo: {e}")
+        return Dadger.read(caminho)
+
+    @property
+    def dadger_state(self) -> Optional[FileState]:
+        return self.__dadger_state
+
+    @property
+    def dadger_patcher(self) -> Optional[DadgerPatcher]:
+        return self.__patcher
+
+    def adopt_dadger(
+        self,
+        d: Dadger,
+        patcher: Optional[DadgerPatcher],
+        state: FileState,
+    ) -> bool:
+        """
+        Uses a dadger read (and possibly changed) beforehand, if the
+        file was not modified since then.
+        """
+        if not unchanged(state):
+            return False
+        self.__read_dadger = True
+        self.__dadger = d
+        self.__patcher = patcher
+        self.__dadger_state = state
+        return True
+
     def set_dadger(self, d: Dadger) -> HTTPResponse:
+        if self.__read_only:
+            return HTTPResponse(
+                code=409, detail="Caso aberto em modo somente leitura"
+            )
+        try:
+            arq = self.arquivos
+            if isinstance(arq, HTTPResponse):
+                raise FileNotFoundError()
+            arq_dadger = arq.dadger
+            if not arq_dadger:
+                raise FileNotFoundError()
+            caminho = join(self.__path, arq_dadger)
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            if self.__patcher is not None and d is self.__dadger:
+                self.__patcher.escreve(temporario)
+            else:
+                d.write(temporario)
+            if same_content(temporario, caminho):
+                os.remove(temporario)
+                Log.log().info(f"Arquivo {arq_dadger} inalterado")
+                self.__guarda_sessao(d, caminho)
+                return HTTPResponse(code=200, detail="")
+            patch = None
+            if self.__patcher is not None and d is self.__dadger:
+                patch = DadgerPatch(
+                    file=arq_dadger,
+                    encoding=self.__patcher.codificacao,
+                    base=fingerprint(caminho),
+                    result=fingerprint(temporario),
+                    changes=self.__patcher.mudancas(),
+                )
+            self.__substitui_dadger(temporario, caminho)
+            Log.log().info(f"Arquivo {arq_dadger} escrito")
+            self.__guarda_patch(arq_dadger, patch)
+            self.__guarda_sessao(d, caminho)
+            return HTTPResponse(code=200, detail="")
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    def __substitui_dadger(self, temporario: str, caminho: str):
+        versao = snapshot(
+            caminho,
+            join(self.__path, Settings.versions_directory),
+            Settings.versions_keep,
+        )
+        os.replace(temporario, caminho)
+        if versao is not None:
+            self.__snapshot_dadger = (str(versao), caminho)
+
+    def __caminho_patch(self, arq_dadger: str) -> str:
+        # Em um subdiretório, para não ser confundido com as versões
+        # do dadger mantidas no mesmo diretório
+        return join(
+            self.__path,
+            Settings.versions_directory,
+            "patches",
+            f"{arq_dadger}.json",
+        )
+
+    def __guarda_patch(self, arq_dadger: str, patch: Optional[DadgerPatch]):
+        # Somente o patch da última escrita é mantido. Escritas sem o
+        # modo patch não o geram, e o anterior deixa de ser válido.
+        caminho = self.__caminho_patch(arq_dadger)
+        try:
+            if patch is None or not Settings.export_dadger_patch:
+                if os.path.isfile(caminho):
+                    os.remove(caminho)
+                return
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            with open(temporario, "wb") as arq:
+                arq.write(dadger_patch_json(patch))
+            os.replace(temporario, caminho)
+        except Exception as e:
+            Log.log().warning(f"Patch do dadger não armazenado: {e}")
+
+    def get_dadger_patch(self) -> Union[DadgerPatch, HTTPResponse]:
+        try:
+            arq = self.arquivos
+            if isinstance(arq, HTTPResponse):
+                raise FileNotFoundError()
+            arq_dadger = arq.dadger
+            if not arq_dadger:
+                raise FileNotFoundError()
+            with open(self.__caminho_patch(arq_dadger), "rb") as conteudo:
+                return DadgerPatch(**orjson.loads(conteudo.read()))
+        except FileNotFoundError:
+            return HTTPResponse(
+                code=404, detail="Não foi encontrado o patch do dadger"
+            )
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    async def apply_dadger_patch(self, patch: DadgerPatch) -> HTTPResponse:
+        """
+        Applies a patch exported by another copy of the case, if the
+        dadger of this case is identical to the base of the patch.
+        """
+        if self.__read_only:
+            return HTTPResponse(
+                code=409, detail="Caso aberto em modo somente leitura"
+            )
+        if patch.version != DADGER_PATCH_VERSION:
+            return HTTPResponse(
+                code=400,
+                detail=f"Versão do patch não suportada: {patch.version}",
+            )
         try:
             arq = self.arquivos
             if isinstance(arq, HTTPResponse):
@@ -127,12 +398,153 @@ class RawFilesRepository(AbstractFilesRepository):
             arq_dadger = arq.dadger
             if not arq_dadger:
                 raise FileNotFoundError()
-            d.write(join(self.__path, arq_dadger))
+            if patch.file != arq_dadger:
+                return HTTPResponse(
+                    code=400,
+                    detail=f"Patch do arquivo {patch.file},"
+                    + f" e não {arq_dadger}",
+                )
+            caminho = join(self.__path, arq_dadger)
+            # A base do patch é o dadger já convertido pela cópia de
+            # origem, e a conversão é aplicada também a esta cópia
+            await self.__converte(caminho)
+            atual = fingerprint(caminho)
+            if atual == patch.result:
+                Log.log().info(f"Patch do {arq_dadger} já aplicado")
+                return HTTPResponse(code=200, detail="")
+            if atual != patch.base:
+                return HTTPResponse(
+                    code=409,
+                    detail=f"O arquivo {arq_dadger} difere da base do patch",
+                )
+            temporario = f"{caminho}.{os.getpid()}.tmp"
+            aplica_mudancas(caminho, temporario, patch.changes, patch.encoding)
+            if fingerprint(temporario) != patch.result:
+                os.remove(temporario)
+                return HTTPResponse(
+                    code=500,
+                    detail="O resultado do patch difere do esperado",
+                )
+            self.__substitui_dadger(temporario, caminho)
+            self.__sessions.pop(caminho)
+            self.__guarda_patch(arq_dadger, patch)
+            Log.log().info(
+                f"Patch aplicado ao {arq_dadger}: "
+                + f"{len(patch.changes)} alterações"
+            )
             return HTTPResponse(code=200, detail="")
+        except FileNotFoundError:
+            msg = "Não foi encontrado o arquivo dadger"
+            return HTTPResponse(code=404, detail=msg)
         except Exception as e:
             return HTTPResponse(code=500, detail=str(e))
 
-    def get_relato(self) -> Union[Relato, HTTPResponse]:
+    def write_variant(
+        self,
+        directory: str,
+        d: Dadger,
+        patcher: Optional[DadgerPatcher] = None,
+    ) -> HTTPResponse:
+        """
+        Writes a variant of the case to another directory: the files of
+        the case are copied and the dadger is written from the given
+        object (through its patcher, when given).
+        """
+        try:
+            arq = self.arquivos
+            if isinstance(arq, HTTPResponse):
+                raise FileNotFoundError()
+            arq_dadger = arq.dadger
+            if not arq_dadger:
+                raise FileNotFoundError()
+            if os.path.realpath(directory) == os.path.realpath(self.__path):
+                return HTTPResponse(
+                    code=409,
+                    detail="A variante não pode ser escrita no próprio caso",
+                )
+            os.makedirs(directory, exist_ok=True)
+            # Os arquivos são copiados (e não ligados), pois o DECOMP
+            # pode reescrevê-los no diretório da variante
+            for entrada in os.scandir(self.__path):
+                if (
+                    entrada.is_file()
+                    and not entrada.name.startswith(".")
+                    and entrada.name != arq_dadger
+                ):
+                    shutil.copy2(entrada.path, join(directory, entrada.name))
+            destino = join(directory, arq_dadger)
+            if patcher is not None:
+                patcher.escreve(destino)
+            else:
+                d.write(destino)
+            Log.log().info(f"Variante escrita em {directory}")
+            return HTTPResponse(code=200, detail="")
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    def __guarda_sessao(self, d: Dadger, caminho: str):
+        if Settings.session_max_cases <= 0:
+            return
+        try:
+            patcher = None
+            if self.__patcher is not None and d is self.__dadger:
+                self.__patcher.reindexa()
+                patcher = self.__patcher
+            self.__sessions.put(
+                CaseSession(
+                    d, patcher, file_state(caminho), fingerprint(caminho)
+                )
+            )
+        except Exception as e:
+            Log.log().warning(f"Sessão do caso não armazenada: {e}")
+
+    def get_dadger_diff(
+        self, d: Dadger
+    ) -> Union[List[DadgerDiffRecord], HTTPResponse]:
+        try:
+            if self.__patcher is not None and d is self.__dadger:
+                return self.__patcher.diferencas()
+            # Sem o modo patch, o diff é obtido comparando o objeto
+            # alterado com uma nova leitura completa do arquivo
+            if self.__dadger_state is None:
+                raise FileNotFoundError("Dadger não lido")
+            caminho = self.__dadger_state[0]
+            Log.log().info(f"Diff do dadger por leitura completa: {caminho}")
+            return diferencas_dadger(Dadger.read(caminho), d)
+        except Exception as e:
+            Log.log().error(f"Erro no diff do dadger: {e}")
+            return HTTPResponse(code=500, detail=str(e))
+
+    def rollback_dadger(self) -> HTTPResponse:
+        if self.__snapshot_dadger is None:
+            return HTTPResponse(code=200, detail="")
+        versao, caminho = self.__snapshot_dadger
+        self.__sessions.pop(caminho)
+        try:
+            restore(versao, caminho)
+            self.__snapshot_dadger = None
+            Log.log().warning(f"Restaurada a versão anterior de {caminho}")
+            return HTTPResponse(code=200, detail="")
+        except Exception as e:
+            Log.log().error(f"Erro na restauração do dadger: {e}")
+            return HTTPResponse(code=500, detail=str(e))
+
+    def __read_relato_cache(self, caminho: str) -> Union[Relato, CachedRelato]:
+        if self.__cache is None:
+            return Relato.read(caminho)
+        chave = fingerprint(caminho)
+        tabelas = {t: self.__cache.get(chave, t) for t in CachedRelato.TABLES}
+        if all(isinstance(t, pd.DataFrame) for t in tabelas.values()):
+            Log.log().info(f"Tabelas do {caminho} obtidas do cache")
+            return CachedRelato(tabelas)
+        relato = Relato.read(caminho)
+        for t in CachedRelato.TABLES:
+            df = getattr(relato, t)
+            if isinstance(df, pd.DataFrame):
+                self.__cache.put(chave, t, df)
+        return relato
+
+    def get_relato(self) -> Union[Relato, CachedRelato, HTTPResponse]:
         if self.__read_relato is False:
             self.__read_relato = True
             try:
@@ -140,7 +552,9 @@ class RawFilesRepository(AbstractFilesRepository):
                 if not arq:
                     raise FileNotFoundError()
                 Log.log().info(f"Lendo arquivo relato.{arq}")
-                self.__relato = Relato.read(join(self.__path, f"relato.{arq}"))
+                self.__relato = self.__read_relato_cache(
+                    join(self.__path, f"relato.{arq}")
+                )
             except FileNotFoundError:
                 msg = "Não foi encontrado o arquivo relato"
                 return HTTPResponse(code=404, detail=msg)
@@ -173,7 +587,44 @@ class RawFilesRepository(AbstractFilesRepository):
                 self.__inviabunic = HTTPResponse(code=404, detail=msg)
         return self.__inviabunic
 
-    def get_hidr(self) -> Union[Hidr, HTTPResponse]:
+    def __read_inviabilidades_cache(self, caminho: str) -> pd.DataFrame:
+        if self.__cache is None:
+            return le_inviabilidades_simulacao_final(caminho)
+        chave = fingerprint(caminho)
+        df = self.__cache.get(chave, "inviabilidades_simulacao_final")
+        if df is not None:
+            Log.log().info(f"Tabela do {caminho} obtida do cache")
+            return df
+        df = le_inviabilidades_simulacao_final(caminho)
+        self.__cache.put(chave, "inviabilidades_simulacao_final", df)
+        return df
+
+    @property
+    def inviabunic_path(self) -> str:
+        return join(self.__path, f"inviab_unic.{self.caso.arquivos}")
+
+    def get_inviabilidades_simulacao_final(
+        self,
+    ) -> Union[pd.DataFrame, HTTPResponse]:
+        if self.__read_inviabilidades is False:
+            self.__read_inviabilidades = True
+            arq = f"inviab_unic.{self.caso.arquivos}"
+            try:
+                Log.log().info(f"Lendo simulação final do arquivo {arq}")
+                self.__inviabilidades = self.__read_inviabilidades_cache(
+                    join(self.__path, arq)
+                )
+            except FileNotFoundError:
+                msg = f"Não encontrado arquivo {arq}"
+                Log.log().info(msg)
+                self.__inviabilidades = HTTPResponse(code=404, detail=msg)
+            except Exception as e:
+                msg = f"Erro na leitura do {arq}: {e}"
+                Log.log().info(msg)
+                self.__inviabilidades = HTTPResponse(code=404, detail=msg)
+        return self.__inviabilidades
+
+    def get_hidr(self) -> Union[HidrMemmap, HTTPResponse]:
         if self.__read_hidr is False:
             self.__read_hidr = True
             try:
@@ -184,7 +635,7 @@ class RawFilesRepository(AbstractFilesRepository):
                 if not arq_hidr:
                     raise FileNotFoundError()
                 Log.log().info(f"Lendo arquivo {arq_hidr}")
-                self.__hidr = Hidr.read(join(self.__path, arq_hidr))
+                self.__hidr = HidrMemmap(join(self.__path, arq_hidr))
             except FileNotFoundError:
                 msg = "Não foi encontrado o arquivo hidr"
                 self.__hidr = HTTPResponse(code=404, detail=msg)
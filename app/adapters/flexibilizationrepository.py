@@ -1,14 +1,36 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Union, Type, Optional
+import asyncio
+import os
+from copy import deepcopy
+from typing import Dict, List, Tuple, Union, Type, Optional
 import pandas as pd  # type: ignore
 from app.internal.httpresponse import HTTPResponse
+from app.internal.lock import LockTimeoutError
+from app.internal.progress import ProgressCallback, notify
+from app.internal.cancellation import (
+    CancellationToken,
+    PipelineCancelledError,
+    check_cancellation,
+)
 from app.models.flexibilizationrule import FlexibilizationRule
-from app.models.flexibilizationresult import FlexibilizationResult
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.models.dadgerdiff import DadgerDiffRecord
+from app.models.flexibilizationvariant import (
+    FlexibilizationVariant,
+    FlexibilizationVariantRecord,
+)
 from app.models.inviabilidade import Inviabilidade
-from app.adapters.violationrepository import AbsoluteViolationRepository
+from app.adapters.violationrepository import AbstractViolationRepository
+from app.adapters.violationrepository import factory as violation_factory
+from app.adapters.rulesrepository import compile_rules
+from app.adapters.planrepository import PreparedPlan
+from app.adapters.planrepository import factory as plan_factory
+from app.internal.fs import file_state
+from app.internal.settings import Settings
 from app.services.unitofwork import AbstractUnitOfWork
 from app.utils.log import Log
-from idecomp.decomp import Dadger, InviabUnic, Relato, Hidr
+from app.utils.hidr import HidrMemmap
+from idecomp.decomp import Dadger
 
 
 class AbstractFlexibilizationRepository(ABC):
@@ -19,7 +41,40 @@ class AbstractFlexibilizationRepository(ABC):
         self,
         rules: List[FlexibilizationRule],
         uow: AbstractUnitOfWork,
-    ) -> Union[List[FlexibilizationResult], HTTPResponse]:
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationRecord], HTTPResponse]:
+        pass
+
+    @abstractmethod
+    async def dry_run(
+        self,
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[
+        Tuple[List[FlexibilizationRecord], List[DadgerDiffRecord]],
+        HTTPResponse,
+    ]:
+        pass
+
+    @abstractmethod
+    async def prepare(
+        self,
+        uow: AbstractUnitOfWork,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[PreparedPlan, HTTPResponse]:
+        pass
+
+    @abstractmethod
+    async def variants(
+        self,
+        variants: List[FlexibilizationVariant],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationVariantRecord], HTTPResponse]:
         pass
 
 
@@ -30,49 +85,379 @@ class NEWAVEFlexibilizationRepository(AbstractFlexibilizationRepository):
         self,
         rules: List[FlexibilizationRule],
         uow: AbstractUnitOfWork,
-    ) -> Union[List[FlexibilizationResult], HTTPResponse]:
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationRecord], HTTPResponse]:
+        return HTTPResponse(code=500, detail="NEWAVE not supported")
+
+    async def dry_run(
+        self,
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[
+        Tuple[List[FlexibilizationRecord], List[DadgerDiffRecord]],
+        HTTPResponse,
+    ]:
+        return HTTPResponse(code=500, detail="NEWAVE not supported")
+
+    async def prepare(
+        self,
+        uow: AbstractUnitOfWork,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[PreparedPlan, HTTPResponse]:
+        return HTTPResponse(code=500, detail="NEWAVE not supported")
+
+    async def variants(
+        self,
+        variants: List[FlexibilizationVariant],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationVariantRecord], HTTPResponse]:
         return HTTPResponse(code=500, detail="NEWAVE not supported")
 
 
 class DECOMPFlexibilizationRepository(AbstractFlexibilizationRepository):
     """ """
 
-    async def flex(
+    @staticmethod
+    def _violation_repository(
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+    ) -> AbstractViolationRepository:
+        regras = compile_rules(rules) if len(rules) > 0 else None
+        if Settings.flex_policy == "ADAPTIVE":
+            return violation_factory(
+                "ADAPTIVE",
+                uow.history.occurrences(),
+                Settings.adaptive_growth_factor,
+                Settings.adaptive_max_factor,
+                regras=regras,
+            )
+        return violation_factory(Settings.flex_policy, regras=regras)
+
+    async def _classifica(
+        self,
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Tuple[Dadger, List[Inviabilidade]]:
+        check_cancellation(cancelamento, "leitura do dadger")
+        dadger = await uow.files.get_dadger()
+        assert isinstance(dadger, Dadger)
+        if progresso is None and cancelamento is None:
+            inviabilidades = self._inviabilidades(uow)
+        else:
+            # Libera o event loop durante a leitura dos arquivos e a
+            # classificação das inviabilidades
+            inviabilidades = await asyncio.to_thread(
+                self._inviabilidades, uow, progresso, cancelamento
+            )
+        return dadger, inviabilidades
+
+    @staticmethod
+    def _inviabilidades(
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> List[Inviabilidade]:
+        check_cancellation(cancelamento, "leitura do inviab_unic")
+        inviab = uow.files.get_inviabilidades_simulacao_final()
+        assert isinstance(inviab, pd.DataFrame)
+        check_cancellation(cancelamento, "leitura do relato")
+        relato = uow.files.get_relato()
+        assert not isinstance(relato, HTTPResponse)
+        check_cancellation(cancelamento, "leitura do hidr")
+        hidr = uow.files.get_hidr()
+        assert isinstance(hidr, HidrMemmap)
+        check_cancellation(cancelamento, "classificação")
+        notify(progresso, "files")
+        # Cria as inviabilidades
+        inviabilidades: List[Inviabilidade] = []
+        for (
+            _,
+            linha,
+        ) in inviab.iterrows():
+            inv = Inviabilidade.factory(linha, hidr, relato)
+            Log.log().info(inv)
+            inviabilidades.append(inv)
+        Log.log().info(
+            f"Inviabilidades processadas com sucesso: {len(inviabilidades)}"
+        )
+        check_cancellation(cancelamento, "flexibilização")
+        notify(progresso, "violations", count=len(inviabilidades))
+        return inviabilidades
+
+    async def _flexibiliza(
         self,
         rules: List[FlexibilizationRule],
         uow: AbstractUnitOfWork,
-    ) -> Union[List[FlexibilizationResult], HTTPResponse]:
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Tuple[Dadger, List[Inviabilidade], List[FlexibilizationRecord]]:
+        dadger, inviabilidades = await self._classifica(
+            uow, progresso, cancelamento
+        )
+        # Flexibiliza
+        repo = self._violation_repository(rules, uow)
+        if progresso is None and cancelamento is None:
+            result = repo.flexibilize(dadger, inviabilidades)
+        else:
+            # Libera o event loop para o envio dos eventos de progresso
+            # e para a detecção da desconexão do cliente
+            result = await asyncio.to_thread(
+                repo.flexibilize,
+                dadger,
+                inviabilidades,
+                progresso,
+                cancelamento,
+            )
+        Log.log().info("Inviabilidades flexibilizadas")
+        return dadger, inviabilidades, result
+
+    @staticmethod
+    def _plano_preparado(
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+    ) -> Optional[PreparedPlan]:
+        # Planos são preparados somente para as regras padrão
+        if len(rules) > 0:
+            return None
+        plano = plan_factory("MEMORY", Settings.watch_max_plans).pop(
+            uow.directory
+        )
+        if plano is None or plano.policy != Settings.flex_policy:
+            return None
+        if plano.occurrences is not None:
+            if plano.occurrences != uow.history.occurrences():
+                return None
+        if not uow.files.adopt_dadger(
+            plano.dadger, plano.patcher, plano.dadger_state
+        ):
+            return None
+        Log.log().info(f"Utilizando plano preparado para {uow.directory}")
+        return plano
+
+    async def prepare(
+        self,
+        uow: AbstractUnitOfWork,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[PreparedPlan, HTTPResponse]:
         try:
-            with uow:
-                dadger = await uow.files.get_dadger()
-                assert isinstance(dadger, Dadger)
-                arq_inviab = uow.files.get_inviabunic()
-                assert isinstance(arq_inviab, InviabUnic)
-                inviab = arq_inviab.inviabilidades_simulacao_final
-                assert isinstance(inviab, pd.DataFrame)
-                relato = uow.files.get_relato()
-                assert isinstance(relato, Relato)
-                hidr = uow.files.get_hidr()
-                assert isinstance(hidr, Hidr)
-                # Cria as inviabilidades
-                inviabilidades: List[Inviabilidade] = []
-                for (
-                    _,
-                    linha,
-                ) in inviab.iterrows():
-                    inv = Inviabilidade.factory(linha, hidr, relato)
-                    Log.log().info(inv)
-                    inviabilidades.append(inv)
-                Log.log().info(
-                    f"Inviabilidades processadas com sucesso: {len(inviabilidades)}"
+            async with uow:
+                dadger, inviabilidades, result = await self._flexibiliza(
+                    [], uow, cancelamento=cancelamento
                 )
-                # Flexibiliza
-                result = AbsoluteViolationRepository().flexibilize(
-                    dadger, inviabilidades
+                estado = uow.files.dadger_state
+                assert estado is not None
+                ocorrencias = (
+                    uow.history.occurrences()
+                    if Settings.flex_policy == "ADAPTIVE"
+                    else None
                 )
-                Log.log().info("Inviabilidades flexibilizadas")
-                uow.files.set_dadger(dadger)
+                return PreparedPlan(
+                    dadger,
+                    uow.files.dadger_patcher,
+                    estado,
+                    file_state(uow.files.inviabunic_path),
+                    inviabilidades,
+                    result,
+                    Settings.flex_policy,
+                    ocorrencias,
+                )
+        except LockTimeoutError as e:
+            Log.log().warning(str(e))
+            return HTTPResponse(code=423, detail=str(e))
+        except PipelineCancelledError as e:
+            Log.log().warning(f"Flexibilização cancelada: {e.detail}")
+            return HTTPResponse(code=e.code, detail=e.detail)
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    async def flex(
+        self,
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationRecord], HTTPResponse]:
+        try:
+            async with uow:
+                plano = self._plano_preparado(rules, uow)
+                if plano is not None:
+                    dadger = plano.dadger
+                    inviabilidades = plano.inviabilidades
+                    result = plano.result
+                    notify(progresso, "prepared", result=result)
+                else:
+                    (
+                        dadger,
+                        inviabilidades,
+                        result,
+                    ) = await self._flexibiliza(
+                        rules, uow, progresso, cancelamento
+                    )
+                check_cancellation(cancelamento, "escrita do dadger")
+                escrita = uow.files.set_dadger(dadger)
+                if escrita.code != 200:
+                    return escrita
+                notify(progresso, "dadger")
+                if Settings.export_parquet:
+                    try:
+                        uow.export.export(inviabilidades, result)
+                        Log.log().info("Tabelas exportadas em Parquet")
+                    except Exception as e:
+                        Log.log().warning(f"Erro na exportação: {e}")
+                if len(result) > 0:
+                    rodada = uow.history.register(result)
+                    Log.log().info(f"Rodada {rodada} registrada no histórico")
+                uow.commit()
                 return result
+        except LockTimeoutError as e:
+            Log.log().warning(str(e))
+            return HTTPResponse(code=423, detail=str(e))
+        except PipelineCancelledError as e:
+            Log.log().warning(f"Flexibilização cancelada: {e.detail}")
+            return HTTPResponse(code=e.code, detail=e.detail)
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    async def dry_run(
+        self,
+        rules: List[FlexibilizationRule],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[
+        Tuple[List[FlexibilizationRecord], List[DadgerDiffRecord]],
+        HTTPResponse,
+    ]:
+        try:
+            async with uow:
+                dadger, _, result = await self._flexibiliza(
+                    rules, uow, progresso, cancelamento
+                )
+                check_cancellation(cancelamento, "diff do dadger")
+                diff = uow.files.get_dadger_diff(dadger)
+                if isinstance(diff, HTTPResponse):
+                    return diff
+                Log.log().info(f"Simulação: {len(diff)} registros alterados")
+                return result, diff
+        except LockTimeoutError as e:
+            Log.log().warning(str(e))
+            return HTTPResponse(code=423, detail=str(e))
+        except PipelineCancelledError as e:
+            Log.log().warning(f"Flexibilização cancelada: {e.detail}")
+            return HTTPResponse(code=e.code, detail=e.detail)
+        except Exception as e:
+            return HTTPResponse(code=500, detail=str(e))
+
+    @staticmethod
+    def _componente_valido(nome: str) -> bool:
+        # Nomes e diretórios das variantes são componentes simples de
+        # caminho, para que não sejam escritas fora da pasta do caso
+        separadores = [os.sep] + ([os.altsep] if os.altsep else [])
+        return (
+            len(nome) > 0
+            and nome not in (os.curdir, os.pardir)
+            and "\0" not in nome
+            and not any(sep in nome for sep in separadores)
+        )
+
+    @staticmethod
+    def _diretorio_variante(
+        caso: str, variante: FlexibilizationVariant
+    ) -> str:
+        caso = caso.rstrip(os.sep)
+        if not variante.directory:
+            return f"{caso}_{variante.name}"
+        return os.path.join(os.path.dirname(caso), variante.directory)
+
+    async def variants(
+        self,
+        variants: List[FlexibilizationVariant],
+        uow: AbstractUnitOfWork,
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> Union[List[FlexibilizationVariantRecord], HTTPResponse]:
+        for v in variants:
+            for nome in (v.name, v.directory or None):
+                if nome is not None and not self._componente_valido(nome):
+                    return HTTPResponse(
+                        code=400,
+                        detail="Nome ou diretório de variante inválido:"
+                        + f" {nome}",
+                    )
+        try:
+            async with uow:
+                diretorios = [
+                    self._diretorio_variante(uow.directory, v)
+                    for v in variants
+                ]
+                if len(set(diretorios)) != len(diretorios):
+                    return HTTPResponse(
+                        code=400, detail="Diretórios de variantes repetidos"
+                    )
+                # O caso é lido e as inviabilidades classificadas uma
+                # única vez, para todas as variantes
+                dadger, inviabilidades = await self._classifica(
+                    uow, progresso, cancelamento
+                )
+                patcher = uow.files.dadger_patcher
+                repos = [
+                    self._violation_repository(v.rules, uow) for v in variants
+                ]
+
+                def __variante(
+                    repo: AbstractViolationRepository, diretorio: str
+                ) -> Tuple[HTTPResponse, List[FlexibilizationRecord]]:
+                    # Cada variante altera a sua própria cópia do dadger
+                    copia = patcher.copia() if patcher is not None else None
+                    if copia is not None:
+                        assert copia.dadger is not None
+                        d = copia.dadger
+                    else:
+                        d = deepcopy(dadger)
+                    result = repo.flexibilize(
+                        d, inviabilidades, cancelamento=cancelamento
+                    )
+                    check_cancellation(cancelamento, "escrita das variantes")
+                    escrita = uow.files.write_variant(diretorio, d, copia)
+                    return escrita, result
+
+                check_cancellation(cancelamento, "flexibilização")
+                resultados = await asyncio.gather(
+                    *[
+                        asyncio.to_thread(__variante, r, d)
+                        for r, d in zip(repos, diretorios)
+                    ]
+                )
+                registros: List[FlexibilizationVariantRecord] = []
+                for v, d, (escrita, result) in zip(
+                    variants, diretorios, resultados
+                ):
+                    if escrita.code != 200:
+                        return escrita
+                    notify(
+                        progresso,
+                        "variant",
+                        name=v.name,
+                        directory=d,
+                        result=result,
+                    )
+                    registros.append(
+                        FlexibilizationVariantRecord(v.name, d, result)
+                    )
+                Log.log().info(f"{len(registros)} variantes escritas")
+                return registros
+        except LockTimeoutError as e:
+            Log.log().warning(str(e))
+            return HTTPResponse(code=423, detail=str(e))
+        except PipelineCancelledError as e:
+            Log.log().warning(f"Flexibilização cancelada: {e.detail}")
+            return HTTPResponse(code=e.code, detail=e.detail)
         except Exception as e:
             return HTTPResponse(code=500, detail=str(e))
 
@@ -0,0 +1,154 @@
+from abc import ABC, abstractmethod
+from contextlib import closing
+from datetime import datetime
+from os.path import abspath, isfile, join
+from typing import Dict, List, Optional, Tuple, Type
+from urllib.parse import quote
+import sqlite3
+
+from app.models.flexibilizationhistory import FlexibilizationHistoryRound
+from app.models.flexibilizationresult import (
+    FlexibilizationRecord,
+    FlexibilizationResult,
+)
+
+# (flexType, flexCode, flexStage, flexPatamar, flexLimit)
+HistoryKey = Tuple[
+    str, Optional[int], Optional[int], Optional[str], Optional[str]
+]
+
+
+def history_key(
+    flex_type: str,
+    codigo: Optional[int],
+    estagio: Optional[int],
+    patamar=None,
+    limite: Optional[str] = None,
+) -> HistoryKey:
+    pat = str(patamar) if patamar is not None else None
+    return (flex_type, codigo, estagio, pat, limite)
+
+
+class AbstractHistoryRepository(ABC):
+    @abstractmethod
+    def register(self, results: List[FlexibilizationRecord]) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def rounds(self) -> List[FlexibilizationHistoryRound]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def occurrences(self) -> Dict[HistoryKey, int]:
+        raise NotImplementedError
+
+
+class SQLiteHistoryRepository(AbstractHistoryRepository):
+    """
+    Keeps the flexibilizations applied to a case in each round in a
+    local SQLite database stored in the case directory.
+    """
+
+    CREATE = """
+        CREATE TABLE IF NOT EXISTS flexibilizacoes (
+            rodada INTEGER NOT NULL,
+            instante TEXT NOT NULL,
+            tipo TEXT,
+            estagio INTEGER,
+            codigo INTEGER,
+            patamar TEXT,
+            limite TEXT,
+            subsistema TEXT,
+            montante REAL
+        )
+    """
+
+    def __init__(self, path: str, filename: str):
+        self.__path = join(path, filename)
+
+    def __connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.__path)
+        conn.execute(SQLiteHistoryRepository.CREATE)
+        return conn
+
+    def __query(self, sql: str) -> List[tuple]:
+        # As consultas não criam o banco nem a tabela, para que as
+        # operações somente leitura não escrevam no caso
+        if not isfile(self.__path):
+            return []
+        uri = f"file:{quote(abspath(self.__path))}?mode=ro"
+        try:
+            with closing(sqlite3.connect(uri, uri=True)) as conn:
+                return conn.execute(sql).fetchall()
+        except sqlite3.OperationalError as e:
+            if "no such table" in str(e):
+                return []
+            raise
+
+    def register(self, results: List[FlexibilizationRecord]) -> int:
+        with closing(self.__connect()) as conn, conn:
+            cur = conn.execute("SELECT MAX(rodada) FROM flexibilizacoes")
+            ultima = cur.fetchone()[0]
+            rodada = 1 if ultima is None else ultima + 1
+            instante = datetime.now().isoformat(timespec="seconds")
+            conn.executemany(
+                "INSERT INTO flexibilizacoes"
+                + " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        rodada,
+                        instante,
+                        r.flexType,
+                        r.flexStage,
+                        r.flexCode,
+                        r.flexPatamar,
+                        r.flexLimit,
+                        r.flexSubsystem,
+                        r.flexAmount,
+                    )
+                    for r in results
+                ],
+            )
+        return rodada
+
+    def rounds(self) -> List[FlexibilizationHistoryRound]:
+        linhas = self.__query(
+            "SELECT rodada, instante, tipo, estagio, codigo, patamar,"
+            + " limite, subsistema, montante FROM flexibilizacoes"
+            + " ORDER BY rodada, rowid"
+        )
+        rodadas: Dict[int, FlexibilizationHistoryRound] = {}
+        for linha in linhas:
+            if linha[0] not in rodadas:
+                rodadas[linha[0]] = FlexibilizationHistoryRound(
+                    round=linha[0], timestamp=linha[1], result=[]
+                )
+            rodadas[linha[0]].result.append(
+                FlexibilizationResult(
+                    flexType=linha[2],
+                    flexStage=linha[3],
+                    flexCode=linha[4],
+                    flexPatamar=linha[5],
+                    flexLimit=linha[6],
+                    flexSubsystem=linha[7],
+                    flexAmount=linha[8],
+                )
+            )
+        return list(rodadas.values())
+
+    def occurrences(self) -> Dict[HistoryKey, int]:
+        linhas = self.__query(
+            "SELECT tipo, codigo, estagio, patamar, limite,"
+            + " COUNT(DISTINCT rodada) FROM flexibilizacoes"
+            + " GROUP BY tipo, codigo, estagio, patamar, limite"
+        )
+        return {
+            history_key(t, c, e, p, lim): n for (t, c, e, p, lim, n) in linhas
+        }
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractHistoryRepository:
+    mapping: Dict[str, Type[AbstractHistoryRepository]] = {
+        "SQLITE": SQLiteHistoryRepository
+    }
+    return mapping.get(kind, SQLiteHistoryRepository)(*args, **kwargs)
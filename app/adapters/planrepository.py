@@ -0,0 +1,95 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from os.path import abspath
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Type
+
+from idecomp.decomp.dadger import Dadger
+
+from app.adapters.historyrepository import HistoryKey
+from app.internal.fs import FileState, unchanged
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.models.inviabilidade import Inviabilidade
+from app.utils.dadgerpatch import DadgerPatcher
+
+
+class PreparedPlan(NamedTuple):
+    """
+    Flexibilization computed ahead of the request for a case, valid
+    while the files it was computed from are unchanged.
+    """
+
+    dadger: Dadger
+    patcher: Optional[DadgerPatcher]
+    dadger_state: FileState
+    inviabunic_state: FileState
+    inviabilidades: List[Inviabilidade]
+    result: List[FlexibilizationRecord]
+    policy: str
+    occurrences: Optional[Dict[HistoryKey, int]]
+
+    @property
+    def valid(self) -> bool:
+        return unchanged(self.dadger_state) and unchanged(
+            self.inviabunic_state
+        )
+
+
+class AbstractPlanRepository(ABC):
+    @abstractmethod
+    def get(self, directory: str) -> Optional[PreparedPlan]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, directory: str, plan: PreparedPlan):
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self, directory: str) -> Optional[PreparedPlan]:
+        raise NotImplementedError
+
+
+class MemoryPlanRepository(AbstractPlanRepository):
+    """
+    Process-wide store of prepared plans, shared by every instance and
+    bounded to the `max_plans` most recently prepared cases.
+    """
+
+    __lock = Lock()
+    __plans: "OrderedDict[str, PreparedPlan]" = OrderedDict()
+
+    def __init__(self, max_plans: int):
+        self.__max_plans = max_plans
+
+    def get(self, directory: str) -> Optional[PreparedPlan]:
+        with self.__lock:
+            plan = self.__plans.get(abspath(directory))
+        if plan is not None and not plan.valid:
+            self.pop(directory)
+            return None
+        return plan
+
+    def put(self, directory: str, plan: PreparedPlan):
+        with self.__lock:
+            chave = abspath(directory)
+            self.__plans.pop(chave, None)
+            self.__plans[chave] = plan
+            while len(self.__plans) > self.__max_plans:
+                self.__plans.popitem(last=False)
+
+    def pop(self, directory: str) -> Optional[PreparedPlan]:
+        with self.__lock:
+            plan = self.__plans.pop(abspath(directory), None)
+        if plan is not None and not plan.valid:
+            return None
+        return plan
+
+
+SUPPORTED_STORES: Dict[str, Type[AbstractPlanRepository]] = {
+    "MEMORY": MemoryPlanRepository,
+}
+DEFAULT = MemoryPlanRepository
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractPlanRepository:
+    return SUPPORTED_STORES.get(kind, DEFAULT)(*args, **kwargs)
@@ -0,0 +1,108 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.models.flexibilizationrule import FlexibilizationRule
+
+# (violationType, violationCode, violationUnit, flexibilizationFactor,
+#  flexibilizationDelta, flexibilizationCap, flexibilizationSkip)
+RuleKey = Tuple[
+    Optional[str],
+    Optional[int],
+    Optional[str],
+    Optional[float],
+    Optional[float],
+    Optional[float],
+    Optional[bool],
+]
+
+CACHE_SIZE = 128
+
+
+class CompiledRules:
+    """
+    Dispatch table of flexibilization rules, indexed by
+    (family, code) and then by unit, where `None` matches any value.
+    Looking up the rule of a violation costs a constant number of
+    dictionary accesses, regardless of the number of rules.
+    """
+
+    def __init__(self, regras: Tuple[RuleKey, ...]):
+        self.__tabela: Dict[
+            Tuple[Optional[str], Optional[int]],
+            Dict[Optional[str], RuleKey],
+        ] = {}
+        # Regras posteriores sobrescrevem as anteriores
+        for r in regras:
+            familia = r[0].upper() if r[0] else None
+            self.__tabela.setdefault((familia, r[1]), {})[r[2]] = r
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self.__tabela.values())
+
+    def __busca(
+        self, familia: str, codigo: Optional[int], unidade: Optional[str]
+    ) -> Optional[RuleKey]:
+        for chave in (
+            (familia, codigo),
+            (familia, None),
+            (None, codigo),
+            (None, None),
+        ):
+            por_unidade = self.__tabela.get(chave)
+            if por_unidade is None:
+                continue
+            regra = por_unidade.get(unidade)
+            if regra is None:
+                regra = por_unidade.get(None)
+            if regra is not None:
+                return regra
+        return None
+
+    def skip(
+        self, familia: str, codigo: Optional[int], unidade: Optional[str]
+    ) -> bool:
+        regra = self.__busca(familia, codigo, unidade)
+        return regra is not None and bool(regra[6])
+
+    def apply(
+        self,
+        familia: str,
+        codigo: Optional[int],
+        unidade: Optional[str],
+        violacao: float,
+        delta: float,
+    ) -> float:
+        regra = self.__busca(familia, codigo, unidade)
+        if regra is None:
+            return violacao + delta
+        fator = regra[3] if regra[3] is not None else 1.0
+        delta = regra[4] if regra[4] is not None else delta
+        valor = fator * violacao + delta
+        if regra[5] is not None:
+            valor = min(valor, regra[5])
+        return valor
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compila(regras: Tuple[RuleKey, ...]) -> CompiledRules:
+    return CompiledRules(regras)
+
+
+def compile_rules(rules: List[FlexibilizationRule]) -> CompiledRules:
+    """
+    Compiles the rules given in a request into a dispatch table. Rule
+    sets with identical contents share the same compiled table.
+    """
+    chave = tuple(
+        (
+            r.violationType,
+            r.violationCode,
+            r.violationUnit,
+            r.flexibilizationFactor,
+            r.flexibilizationDelta,
+            r.flexibilizationCap,
+            r.flexibilizationSkip,
+        )
+        for r in rules
+    )
+    return _compila(chave)
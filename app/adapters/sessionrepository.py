@@ -0,0 +1,112 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from os.path import abspath
+from threading import Lock
+from typing import Dict, NamedTuple, Optional, Type
+
+from idecomp.decomp.dadger import Dadger
+
+from app.adapters.cacherepository import fingerprint
+from app.internal.fs import FileState, unchanged
+from app.utils.dadgerpatch import DadgerPatcher
+from app.utils.metrics import Metrics
+
+
+class CaseSession(NamedTuple):
+    """
+    Dadger object last written to a case, kept in memory for the next
+    flexibilization round while the file is unchanged.
+    """
+
+    dadger: Dadger
+    patcher: Optional[DadgerPatcher]
+    state: FileState
+    digest: str
+
+    @property
+    def size(self) -> int:
+        return self.state[1]
+
+    @property
+    def valid(self) -> bool:
+        # O hash só é calculado se o tamanho e o instante de modificação
+        # do arquivo não tiverem mudado
+        return unchanged(self.state) and fingerprint(self.state[0]) == (
+            self.digest
+        )
+
+
+class AbstractSessionRepository(ABC):
+    @abstractmethod
+    def put(self, session: CaseSession):
+        raise NotImplementedError
+
+    @abstractmethod
+    def pop(self, path: str) -> Optional[CaseSession]:
+        raise NotImplementedError
+
+
+class MemorySessionRepository(AbstractSessionRepository):
+    """
+    Process-wide store of case sessions, indexed by the dadger path,
+    bounded to `max_cases` sessions and to `max_bytes` (estimated by the
+    size of the dadger files), evicting the least recently used ones.
+    """
+
+    __lock = Lock()
+    __sessions: "OrderedDict[str, CaseSession]" = OrderedDict()
+    __bytes = 0
+
+    def __init__(self, max_cases: int, max_bytes: int):
+        self.__max_cases = max_cases
+        self.__max_bytes = max_bytes
+
+    @classmethod
+    def __remove(cls, chave: str) -> Optional[CaseSession]:
+        session = cls.__sessions.pop(chave, None)
+        if session is not None:
+            cls.__bytes -= session.size
+        return session
+
+    def put(self, session: CaseSession):
+        if self.__max_cases <= 0 or session.size > self.__max_bytes:
+            return
+        cls = MemorySessionRepository
+        with self.__lock:
+            chave = abspath(session.state[0])
+            cls.__remove(chave)
+            cls.__sessions[chave] = session
+            cls.__bytes += session.size
+            while (
+                len(cls.__sessions) > self.__max_cases
+                or cls.__bytes > self.__max_bytes
+            ):
+                _, antiga = cls.__sessions.popitem(last=False)
+                cls.__bytes -= antiga.size
+                Metrics.increment("session_evicted_total")
+            Metrics.set_gauge("session_cases", len(cls.__sessions))
+            Metrics.set_gauge("session_bytes", cls.__bytes)
+
+    def pop(self, path: str) -> Optional[CaseSession]:
+        cls = MemorySessionRepository
+        with self.__lock:
+            session = cls.__remove(abspath(path))
+            Metrics.set_gauge("session_cases", len(cls.__sessions))
+            Metrics.set_gauge("session_bytes", cls.__bytes)
+        if session is None:
+            return None
+        if not session.valid:
+            Metrics.increment("session_stale_total")
+            return None
+        Metrics.increment("session_hits_total")
+        return session
+
+
+SUPPORTED_STORES: Dict[str, Type[AbstractSessionRepository]] = {
+    "MEMORY": MemorySessionRepository,
+}
+DEFAULT = MemorySessionRepository
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractSessionRepository:
+    return SUPPORTED_STORES.get(kind, DEFAULT)(*args, **kwargs)
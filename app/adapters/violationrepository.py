@@ -1,5 +1,6 @@
 from abc import abstractmethod, ABC
-from typing import List, Tuple, Dict, Type
+from copy import copy
+from typing import List, Tuple, Dict, Type, Optional
 import numpy as np  # type: ignore
 from idecomp.decomp.dadger import Dadger
 from idecomp.decomp.modelos.dadger import (
@@ -29,7 +30,11 @@ from app.models.inviabilidade import InviabilidadeHE
 from app.models.inviabilidade import InviabilidadeDEFMIN
 from app.models.inviabilidade import InviabilidadeFP
 from app.models.inviabilidade import InviabilidadeDeficit
-from app.models.flexibilizationresult import FlexibilizationResult
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.adapters.historyrepository import HistoryKey, history_key
+from app.adapters.rulesrepository import CompiledRules
+from app.internal.progress import ProgressCallback, notify
+from app.internal.cancellation import CancellationToken, check_cancellation
 from app.utils.log import Log
 
 
@@ -46,86 +51,186 @@ class AbstractViolationRepository(ABC):
         InviabilidadeDeficit,
     ]
 
+    nomes_inviabilidades: Dict[Type[Inviabilidade], str] = {
+        InviabilidadeEV: "EV",
+        InviabilidadeTI: "TI",
+        InviabilidadeHV: "HV",
+        InviabilidadeHQ: "HQ",
+        InviabilidadeRE: "RE",
+        InviabilidadeHE: "HE",
+        InviabilidadeDEFMIN: "DEFMIN",
+        InviabilidadeFP: "FP",
+        InviabilidadeDeficit: "DEFICIT",
+    }
+
+    def __init__(self, regras: Optional[CompiledRules] = None):
+        self._regras = regras
+
+    def _familia(self, tipo: Type[Inviabilidade]) -> str:
+        return AbstractViolationRepository.nomes_inviabilidades[tipo]
+
+    def _ignora(
+        self, inv: Inviabilidade, codigo: Optional[int] = None
+    ) -> bool:
+        if self._regras is None:
+            return False
+        if codigo is None:
+            codigo = getattr(inv, "_codigo", None)
+        return self._regras.skip(
+            self._familia(type(inv)), codigo, inv._unidade
+        )
+
+    def _valor_flex(
+        self,
+        tipo: Type[Inviabilidade],
+        inv: Inviabilidade,
+        violacao: float,
+        delta: float,
+        codigo: Optional[int] = None,
+    ) -> float:
+        if codigo is None:
+            codigo = getattr(inv, "_codigo", None)
+        if self._regras is None:
+            return violacao + delta
+        return self._regras.apply(
+            self._familia(tipo), codigo, inv._unidade, violacao, delta
+        )
+
+    @abstractmethod
+    def _delta(
+        self,
+        tipo: Type[Inviabilidade],
+        codigo: int,
+        estagio: int,
+        patamar: Optional[int] = None,
+        limite: Optional[str] = None,
+    ) -> float:
+        pass
+
     @abstractmethod
     def _flexibilizaEV(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeEV]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaTI(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeTI]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaHV(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHV]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaHQ(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHQ]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaRE(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeRE]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaHE(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHE]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaDEFMIN(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeDEFMIN]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibilizaFP(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeFP]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     @abstractmethod
     def _flexibiliza_deficit(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeDeficit]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         pass
 
     def flexibilize(
-        self, dadger: Dadger, inviabilidades: List[Inviabilidade]
-    ) -> List[FlexibilizationResult]:
+        self,
+        dadger: Dadger,
+        inviabilidades: List[Inviabilidade],
+        progresso: Optional[ProgressCallback] = None,
+        cancelamento: Optional[CancellationToken] = None,
+    ) -> List[FlexibilizationRecord]:
+        def __notifica(
+            tipo: Type[Inviabilidade], flex: List[FlexibilizationRecord]
+        ) -> List[FlexibilizationRecord]:
+            familia = self._familia(tipo)
+            notify(progresso, "family", family=familia, result=flex)
+            check_cancellation(cancelamento, f"família {familia}")
+            return flex
+
         # Agrupa as inviabilidades por tipo
         tipos = AbstractViolationRepository.tipos_inviabilidades
         invs_por_tipo: dict = {t: [] for t in tipos}
         for inv in inviabilidades:
+            if self._ignora(inv):
+                Log.log().info(f"Ignorando por regra: {inv}")
+                continue
             invs_por_tipo[type(inv)].append(inv)
 
         # Flexibiliza cada tipo
-        flex_evs = self._flexibilizaEV(dadger, invs_por_tipo[InviabilidadeEV])
-        flex_tis = self._flexibilizaTI(dadger, invs_por_tipo[InviabilidadeTI])
-        flex_hvs = self._flexibilizaHV(dadger, invs_por_tipo[InviabilidadeHV])
-        flex_hqs = self._flexibilizaHQ(dadger, invs_por_tipo[InviabilidadeHQ])
-        flex_res = self._flexibilizaRE(dadger, invs_por_tipo[InviabilidadeRE])
-        flex_hes = self._flexibilizaHE(dadger, invs_por_tipo[InviabilidadeHE])
-        flex_defmins = self._flexibilizaDEFMIN(
-            dadger, invs_por_tipo[InviabilidadeDEFMIN]
+        flex_evs = __notifica(
+            InviabilidadeEV,
+            self._flexibilizaEV(dadger, invs_por_tipo[InviabilidadeEV]),
+        )
+        flex_tis = __notifica(
+            InviabilidadeTI,
+            self._flexibilizaTI(dadger, invs_por_tipo[InviabilidadeTI]),
+        )
+        flex_hvs = __notifica(
+            InviabilidadeHV,
+            self._flexibilizaHV(dadger, invs_por_tipo[InviabilidadeHV]),
+        )
+        flex_hqs = __notifica(
+            InviabilidadeHQ,
+            self._flexibilizaHQ(dadger, invs_por_tipo[InviabilidadeHQ]),
+        )
+        flex_res = __notifica(
+            InviabilidadeRE,
+            self._flexibilizaRE(dadger, invs_por_tipo[InviabilidadeRE]),
+        )
+        flex_hes = __notifica(
+            InviabilidadeHE,
+            self._flexibilizaHE(dadger, invs_por_tipo[InviabilidadeHE]),
+        )
+        flex_defmins = __notifica(
+            InviabilidadeDEFMIN,
+            self._flexibilizaDEFMIN(
+                dadger, invs_por_tipo[InviabilidadeDEFMIN]
+            ),
+        )
+        flex_fps = __notifica(
+            InviabilidadeFP,
+            self._flexibilizaFP(dadger, invs_por_tipo[InviabilidadeFP]),
         )
-        flex_fps = self._flexibilizaFP(dadger, invs_por_tipo[InviabilidadeFP])
         # PREMISSA
         # Só flexibiliza déficit se todas as inviabilidades forem déficit
+        # (desconsiderando as ignoradas por regra)
         flex_defs = []
-        if len(inviabilidades) == len(invs_por_tipo[InviabilidadeDeficit]):
-            flex_defs = self._flexibiliza_deficit(
-                dadger, invs_por_tipo[InviabilidadeDeficit]
+        num_invs = sum(len(invs) for invs in invs_por_tipo.values())
+        if num_invs == len(invs_por_tipo[InviabilidadeDeficit]):
+            flex_defs = __notifica(
+                InviabilidadeDeficit,
+                self._flexibiliza_deficit(
+                    dadger, invs_por_tipo[InviabilidadeDeficit]
+                ),
             )
         return (
             flex_evs
@@ -153,10 +258,21 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
         InviabilidadeDeficit: 2.0,
     }
 
+    # Override
+    def _delta(
+        self,
+        tipo: Type[Inviabilidade],
+        codigo: int,
+        estagio: int,
+        patamar: Optional[int] = None,
+        limite: Optional[str] = None,
+    ) -> float:
+        return self.deltas_inviabilidades[tipo]
+
     # Override
     def _flexibilizaEV(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeEV]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeEV) -> Tuple[int, int]:
             return (inv._codigo, inv._estagio)
 
@@ -173,7 +289,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                     max_viol = i
             return max_viol
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter os pares (código, estágio) já flexibilizados
         flexibilizados: List[Tuple[int, int]] = []
         for inv in inviabilidades:
@@ -195,7 +311,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 + "Evaporação do registro UH desabilitada."
             )
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="EV",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -210,7 +326,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaTI(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeTI]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeTI) -> Tuple[int, int]:
             return (inv._codigo, inv._estagio)
 
@@ -227,7 +343,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                     max_viol = i
             return max_viol
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter os pares (código, estágio) já flexibilizados
         flexibilizados: List[Tuple[int, int]] = []
         for inv in inviabilidades:
@@ -249,14 +365,18 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             taxas = reg.taxa
             assert isinstance(taxas, list)
             valor_atual = taxas[idx]
-            deltas = AbsoluteViolationRepository.deltas_inviabilidades
-            valor_flex = max_viol._violacao + deltas[InviabilidadeTI]
+            delta = self._delta(
+                InviabilidadeTI, max_viol._codigo, max_viol._estagio
+            )
+            valor_flex = self._valor_flex(
+                InviabilidadeTI, max_viol, max_viol._violacao, delta
+            )
             novo_valor = max([0, valor_atual - valor_flex])
             taxas[idx] = novo_valor
             reg.taxa = taxas
             Log.log().info(f"{valor_atual} -> {novo_valor}")
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="TI",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -271,7 +391,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaHV(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHV]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeHV) -> Tuple[int, int, str]:
             return (inv._codigo, inv._estagio, inv._limite)
 
@@ -299,7 +419,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             for e in range(ei, ef + 1):
                 dadger.lv(codigo_restricao=max_viol._codigo, estagio=e)
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter as tuplas
         # (código, estágio, limite) já flexibilizados
         flexibilizados: List[Tuple[int, int, str]] = []
@@ -317,7 +437,12 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 codigo_restricao=max_viol._codigo, estagio=max_viol._estagio
             )
             assert isinstance(reg, LV)
-            deltas = AbsoluteViolationRepository.deltas_inviabilidades
+            delta = self._delta(
+                InviabilidadeHV,
+                max_viol._codigo,
+                max_viol._estagio,
+                limite=max_viol._limite,
+            )
             Log.log().info(
                 f"Flexibilizando HV {max_viol._codigo} - Estágio"
                 + f" {max_viol._estagio}"
@@ -340,7 +465,9 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         valor_atual = lv_aux.limite_inferior
 
                 assert isinstance(valor_atual, float)
-                valor_flex = max_viol._violacao + deltas[InviabilidadeHV]
+                valor_flex = self._valor_flex(
+                    InviabilidadeHV, max_viol, max_viol._violacao, delta
+                )
                 # Confere quantos CV a HV possui:
                 cvs_hv = dadger.cv(codigo_restricao=max_viol._codigo)
                 if isinstance(cvs_hv, list):
@@ -377,14 +504,16 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         valor_atual = lv_aux.limite_superior
 
                 assert isinstance(valor_atual, float)
-                valor_flex = max_viol._violacao + deltas[InviabilidadeHV]
+                valor_flex = self._valor_flex(
+                    InviabilidadeHV, max_viol, max_viol._violacao, delta
+                )
                 novo_valor = min([99999, valor_atual + valor_flex])
                 reg.limite_superior = novo_valor
             Log.log().info(
                 f" {max_viol._limite}: " + f"{valor_atual} -> {novo_valor}"
             )
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="HV",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -399,7 +528,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaHQ(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHQ]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(
             inv: InviabilidadeHQ,
         ) -> Tuple[int, int, str, str]:
@@ -429,7 +558,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             for e in range(ei, ef + 1):
                 dadger.lq(codigo_restricao=max_viol._codigo, estagio=e)
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter as tuplas
         # (código, estágio, limite, patamar) já flexibilizados
         flexibilizados: List[Tuple[int, int, str, str]] = []
@@ -447,7 +576,13 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 codigo_restricao=max_viol._codigo, estagio=max_viol._estagio
             )
             assert isinstance(reg, LQ)
-            deltas = AbsoluteViolationRepository.deltas_inviabilidades
+            delta = self._delta(
+                InviabilidadeHQ,
+                max_viol._codigo,
+                max_viol._estagio,
+                max_viol._patamar,
+                max_viol._limite,
+            )
             idx = max_viol._patamar - 1
             Log.log().info(
                 f"Flexibilizando HQ {max_viol._codigo} - Estágio"
@@ -469,7 +604,9 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         limites_lq = lq_estagio.limite_inferior
                         assert isinstance(limites_lq, list)
                         valor_atual = limites_lq[idx]
-                valor_flex = max_viol._violacao + deltas[InviabilidadeHQ]
+                valor_flex = self._valor_flex(
+                    InviabilidadeHQ, max_viol, max_viol._violacao, delta
+                )
                 novo_valor = max([0, valor_atual - valor_flex])
                 limites[idx] = novo_valor
                 reg.limite_inferior = limites
@@ -490,7 +627,9 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         assert isinstance(limites_lq, list)
                         valor_atual = limites_lq[idx]
 
-                valor_flex = max_viol._violacao + deltas[InviabilidadeHQ]
+                valor_flex = self._valor_flex(
+                    InviabilidadeHQ, max_viol, max_viol._violacao, delta
+                )
                 novo_valor = min([99999, valor_atual + valor_flex])
                 limites[idx] = novo_valor
                 reg.limite_superior = limites
@@ -498,7 +637,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 f" {max_viol._limite}: " + f"{valor_atual} -> {novo_valor}"
             )
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="HQ",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -513,7 +652,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaRE(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeRE]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(
             inv: InviabilidadeRE,
         ) -> Tuple[int, int, str, str]:
@@ -543,7 +682,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             for e in range(ei, ef + 1):
                 dadger.lu(codigo_restricao=max_viol._codigo, estagio=e)
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter as tuplas
         # (código, estágio, limite, patamar) já flexibilizados
         flexibilizados: List[Tuple[int, int, str, str]] = []
@@ -561,7 +700,13 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 codigo_restricao=max_viol._codigo, estagio=max_viol._estagio
             )
             assert isinstance(reg, LU)
-            deltas = AbsoluteViolationRepository.deltas_inviabilidades
+            delta = self._delta(
+                InviabilidadeRE,
+                max_viol._codigo,
+                max_viol._estagio,
+                max_viol._patamar,
+                max_viol._limite,
+            )
             idx = max_viol._patamar - 1
             Log.log().info(
                 f"Flexibilizando RE {max_viol._codigo} - Estágio"
@@ -584,7 +729,9 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         assert isinstance(limites_aux, list)
                         valor_atual = limites_aux[idx]
 
-                valor_flex = max_viol._violacao + deltas[InviabilidadeRE]
+                valor_flex = self._valor_flex(
+                    InviabilidadeRE, max_viol, max_viol._violacao, delta
+                )
                 novo_valor = max([0, valor_atual - valor_flex])
                 novos = reg.limite_inferior
                 assert isinstance(novos, list)
@@ -607,7 +754,9 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                         assert isinstance(limites_aux, list)
                         valor_atual = limites_aux[idx]
 
-                valor_flex = max_viol._violacao + deltas[InviabilidadeRE]
+                valor_flex = self._valor_flex(
+                    InviabilidadeRE, max_viol, max_viol._violacao, delta
+                )
                 novo_valor = min([99999, valor_atual + valor_flex])
                 novos = reg.limite_superior
                 assert isinstance(novos, list)
@@ -617,7 +766,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 f" {max_viol._limite}: " + f"{valor_atual} -> {novo_valor}"
             )
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="RE",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -632,7 +781,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaFP(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeFP]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeFP) -> Tuple[int, int]:
             return (inv._codigo, inv._estagio)
 
@@ -649,7 +798,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                     max_viol = i
             return max_viol
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter os pares (código, estágio) já flexibilizados
         flexibilizados: List[Tuple[int, int]] = []
         for inv in inviabilidades:
@@ -711,7 +860,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 assert isinstance(reg_fc, FC)
                 dadger.data.add_after(reg_fc, reg_fp_novo)
                 res.append(
-                    FlexibilizationResult(
+                    FlexibilizationRecord(
                         flexType="FP",
                         flexStage=identificacao[1],
                         flexCode=identificacao[0],
@@ -726,7 +875,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaDEFMIN(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeDEFMIN]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeDEFMIN) -> Tuple[int, int, str]:
             return (inv._codigo, inv._estagio, inv._patamar)
 
@@ -743,7 +892,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                     max_viol = i
             return max_viol
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter os pares (código, estágio, patamar)
         # já flexibilizados
         flexibilizados: List[Tuple[int, int, str]] = []
@@ -775,7 +924,13 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             assert isinstance(reg_ac, ACVAZMIN)
 
             # Flexibiliza
-            valor_flex = int(np.ceil(max_viol._violacao))
+            valor_flex = int(
+                np.ceil(
+                    self._valor_flex(
+                        InviabilidadeDEFMIN, max_viol, max_viol._violacao, 0
+                    )
+                )
+            )
             vazao = reg_ac.vazao
             assert isinstance(vazao, int)
             novo_valor = np.max([0, -valor_flex])
@@ -786,7 +941,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             )
             reg_ac.vazao = novo_valor
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="DEFMIN",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -801,7 +956,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibilizaHE(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeHE]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeHE) -> Tuple[int, int, str]:
             return (inv._codigo, inv._estagio, inv._limite)
 
@@ -818,7 +973,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                     max_viol = i
             return max_viol
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter as tuplas
         # (código, estágio, limite) já flexibilizados
         flexibilizados: List[Tuple[int, int, str]] = []
@@ -839,24 +994,31 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                 f"Flexibilizando HE {max_viol._codigo} - Estágio"
                 + f" {max_viol._estagio}"
             )
-            deltas = AbsoluteViolationRepository.deltas_inviabilidades
             if max_viol._limite != "L. INF":
                 raise RuntimeError("Restrições RHE só aceitas para L. INF")
+            delta_base = self._delta(
+                InviabilidadeHE,
+                max_viol._codigo,
+                max_viol._estagio,
+                limite=max_viol._limite,
+            )
             if max_viol._unidade == "%":
-                delta = deltas[InviabilidadeHE]
+                delta = delta_base
             if max_viol._unidade == "MWmes":
-                delta = 100 * deltas[InviabilidadeHE]
+                delta = 100 * delta_base
             valor_atual = reg.limite
             if not valor_atual:
                 valor_atual = 0.0
-            valor_flex = max_viol._violacao + delta
+            valor_flex = self._valor_flex(
+                InviabilidadeHE, max_viol, max_viol._violacao, delta
+            )
             novo_valor = max([0, valor_atual - valor_flex])
             reg.limite = novo_valor
             Log.log().info(
                 f" {max_viol._limite}: " + f"{valor_atual} -> {novo_valor}"
             )
             res.append(
-                FlexibilizationResult(
+                FlexibilizationRecord(
                     flexType="HE",
                     flexStage=identificacao[1],
                     flexCode=identificacao[0],
@@ -871,14 +1033,16 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
     # Override
     def _flexibiliza_deficit(
         self, dadger: Dadger, inviabilidades: List[InviabilidadeDeficit]
-    ) -> List[FlexibilizationResult]:
+    ) -> List[FlexibilizationRecord]:
         def __identifica_inv(inv: InviabilidadeDeficit) -> Tuple[int, str]:
             return (inv._estagio, inv._subsistema)
 
         def __inv_maxima_violacao_identificada(
             invs: List[InviabilidadeDeficit], inv_ini: InviabilidadeDeficit
         ) -> InviabilidadeDeficit:
-            max_viol = inv_ini
+            # Acumula em uma cópia, sem alterar as inviabilidades, que
+            # são compartilhadas entre as variantes
+            max_viol = copy(inv_ini)
             ident_ini = __identifica_inv(inv_ini)
             invs_mesma_id = [
                 i for i in invs if __identifica_inv(i) == ident_ini
@@ -895,7 +1059,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
             "N": [4, 8, 9],
         }
 
-        res: List[FlexibilizationResult] = []
+        res: List[FlexibilizationRecord] = []
         # Estrutura para conter as tuplas
         # (estagio, subsis) já flexibilizados
         flexibilizados: List[Tuple[int, str]] = []
@@ -932,14 +1096,29 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                             )
                             continue
                         assert isinstance(reg, HE)
+                        # As regras do déficit são identificadas pelo
+                        # código da restrição HE flexibilizada
+                        if self._ignora(max_viol, codigo=reg.codigo_restricao):
+                            Log.log().info(
+                                "Ignorando por regra: HE"
+                                + f" {reg.codigo_restricao} ({max_viol})"
+                            )
+                            continue
                         valor_atual = reg.limite
                         if not valor_atual:
                             valor_atual = 0.0
-                        deltas = (
-                            AbsoluteViolationRepository.deltas_inviabilidades
+                        delta = self._delta(
+                            InviabilidadeDeficit,
+                            cm.codigo_restricao,
+                            max_viol._estagio,
+                        )
+                        valor_flex = self._valor_flex(
+                            InviabilidadeDeficit,
+                            max_viol,
+                            max_viol._violacao_percentual,
+                            delta,
+                            codigo=reg.codigo_restricao,
                         )
-                        delta = deltas[InviabilidadeDeficit]
-                        valor_flex = max_viol._violacao_percentual + delta
                         novo_valor = max([0.0, valor_atual - valor_flex])
                         reg.limite = novo_valor
                         msg = (
@@ -957,7 +1136,7 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                                 + " pelo déficit"
                             )
                         res.append(
-                            FlexibilizationResult(
+                            FlexibilizationRecord(
                                 flexType="DEFICIT",
                                 flexStage=max_viol._estagio,
                                 flexCode=reg.codigo_restricao,
@@ -968,3 +1147,57 @@ class AbsoluteViolationRepository(AbstractViolationRepository):
                             )
                         )
         return res
+
+
+class AdaptiveViolationRepository(AbsoluteViolationRepository):
+    """
+    Grows the absolute flexibilization deltas of the constraints that
+    were already flexibilized in previous rounds of the same case, so
+    that recurring violations converge in fewer DECOMP executions.
+    """
+
+    def __init__(
+        self,
+        ocorrencias: Dict[HistoryKey, int],
+        fator_crescimento: float,
+        fator_maximo: float,
+        regras: Optional[CompiledRules] = None,
+    ):
+        super().__init__(regras)
+        self.__ocorrencias = ocorrencias
+        self.__fator_crescimento = fator_crescimento
+        self.__fator_maximo = fator_maximo
+
+    # Override
+    def _delta(
+        self,
+        tipo: Type[Inviabilidade],
+        codigo: int,
+        estagio: int,
+        patamar: Optional[int] = None,
+        limite: Optional[str] = None,
+    ) -> float:
+        delta = super()._delta(tipo, codigo, estagio, patamar, limite)
+        chave = history_key(
+            self.nomes_inviabilidades[tipo], codigo, estagio, patamar, limite
+        )
+        n = self.__ocorrencias.get(chave, 0)
+        if n == 0:
+            return delta
+        fator = min(self.__fator_crescimento**n, self.__fator_maximo)
+        Log.log().info(
+            f"Delta adaptativo para {chave}: {n} rodada(s) anteriores,"
+            + f" {delta} -> {delta * fator}"
+        )
+        return delta * fator
+
+
+SUPPORTED_POLICIES: Dict[str, Type[AbstractViolationRepository]] = {
+    "ABSOLUTE": AbsoluteViolationRepository,
+    "ADAPTIVE": AdaptiveViolationRepository,
+}
+DEFAULT = AbsoluteViolationRepository
+
+
+def factory(kind: str, *args, **kwargs) -> AbstractViolationRepository:
+    return SUPPORTED_POLICIES.get(kind, DEFAULT)(*args, **kwargs)
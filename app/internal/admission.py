@@ -0,0 +1,156 @@
+import asyncio
+import glob
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional, Tuple
+
+from app.internal.settings import Settings
+from app.utils.metrics import Metrics
+from app.utils.singleton import Singleton
+
+# Arquivos cujo tamanho estima o custo da flexibilização de um caso
+PADROES_CUSTO = ["dadger.*", "inviab_unic.*"]
+
+
+class AdmissionRejectedError(Exception):
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def estimate_cost(directory: str) -> float:
+    """
+    Estimates the cost of flexibilizing a case by the size (in bytes)
+    of its dadger and inviab_unic files.
+    """
+    custo = 0
+    for padrao in PADROES_CUSTO:
+        for caminho in glob.glob(os.path.join(directory, padrao)):
+            try:
+                custo += os.path.getsize(caminho)
+            except OSError:
+                pass
+    return float(custo)
+
+
+class _Waiter:
+    def __init__(self, priority: str, rank: int, cost: float, seq: int):
+        self.priority = priority
+        self.rank = rank
+        self.cost = cost
+        self.seq = seq
+        self.start = time.monotonic()
+        self.future: asyncio.Future = (
+            asyncio.get_running_loop().create_future()
+        )
+
+
+class AdmissionController(metaclass=Singleton):
+    """
+    Bounds the number of flexibilization pipelines running at the same
+    time, holding the exceeding requests in a bounded wait queue.
+    Waiting requests are served by priority class and, within a class,
+    shortest (estimated) job first. Requests waiting for longer than
+    the aging period are promoted ahead of every class, in arrival
+    order, so that no request starves.
+    """
+
+    def __init__(self):
+        self.__max_concurrent = Settings.admission_max_concurrent
+        self.__max_queue = Settings.admission_max_queue
+        self.__timeout = Settings.admission_queue_timeout
+        self.__retry_after = Settings.admission_retry_after
+        self.__aging = Settings.admission_aging
+        self.__classes = [
+            c.strip().upper()
+            for c in Settings.admission_priority_classes.split(",")
+            if c.strip()
+        ]
+        self.__running = 0
+        self.__waiters: List[_Waiter] = []
+        self.__seq = 0
+
+    @property
+    def classes(self) -> List[str]:
+        return list(self.__classes)
+
+    def __class_of(self, priority: Optional[str]) -> Tuple[str, int]:
+        classe = (priority or "").upper()
+        if classe not in self.__classes:
+            classe = Settings.admission_default_priority.upper()
+        if classe not in self.__classes:
+            return classe, len(self.__classes)
+        return classe, self.__classes.index(classe)
+
+    def __reject(self, detail: str):
+        Metrics.increment("admission_rejected_total")
+        raise AdmissionRejectedError(detail, self.__retry_after)
+
+    def __update_gauges(self):
+        Metrics.set_gauge("admission_running", self.__running)
+        Metrics.set_gauge("admission_queue_depth", len(self.__waiters))
+        for c in self.__classes:
+            Metrics.set_gauge(
+                f"admission_queue_depth_{c.lower()}",
+                sum(1 for w in self.__waiters if w.priority == c),
+            )
+
+    def __key(self, w: _Waiter, now: float) -> tuple:
+        if self.__aging > 0 and now - w.start >= self.__aging:
+            return (-1, 0.0, w.seq)
+        return (w.rank, w.cost, w.seq)
+
+    def __dispatch(self):
+        while self.__running < self.__max_concurrent and self.__waiters:
+            agora = time.monotonic()
+            w = min(self.__waiters, key=lambda w: self.__key(w, agora))
+            if self.__key(w, agora)[0] < 0 and w.rank > 0:
+                Metrics.increment("admission_promoted_total")
+            self.__waiters.remove(w)
+            self.__running += 1
+            w.future.set_result(True)
+        self.__update_gauges()
+
+    def __release(self):
+        self.__running -= 1
+        self.__dispatch()
+
+    def __observe_wait(self, w: _Waiter):
+        espera = time.monotonic() - w.start
+        Metrics.observe("admission_wait_seconds", espera)
+        Metrics.observe(f"admission_wait_seconds_{w.priority.lower()}", espera)
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, cost: float = 0.0):
+        limite = self.__max_concurrent + self.__max_queue
+        if self.__running + len(self.__waiters) >= limite:
+            self.__reject("Fila de requisições cheia")
+        classe, rank = self.__class_of(priority)
+        self.__seq += 1
+        w = _Waiter(classe, rank, cost, self.__seq)
+        self.__waiters.append(w)
+        self.__dispatch()
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(w.future), timeout=self.__timeout
+            )
+        except asyncio.TimeoutError:
+            if not w.future.done():
+                self.__waiters.remove(w)
+                self.__update_gauges()
+                self.__observe_wait(w)
+                self.__reject("Tempo de espera na fila excedido")
+        except asyncio.CancelledError:
+            if w.future.done():
+                self.__release()
+            else:
+                self.__waiters.remove(w)
+                self.__update_gauges()
+            raise
+        self.__observe_wait(w)
+        try:
+            yield
+        finally:
+            self.__release()
@@ -0,0 +1,127 @@
+import asyncio
+import random
+from typing import Optional, Set
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from app.internal.requestid import REQUEST_ID_HEADER, bind_task, request_id
+from app.internal.settings import Settings
+from app.utils.log import Log
+from app.utils.metrics import Metrics
+from app.utils.singleton import Singleton
+
+# Respostas do destino que justificam uma nova tentativa
+STATUS_RETENTATIVA = {408, 425, 429, 500, 502, 503, 504}
+ESQUEMAS_CALLBACK = {"http", "https"}
+
+
+def valid_callback_url(url: str) -> bool:
+    """
+    Whether the URL can receive callbacks: an absolute http(s) URL.
+    """
+    try:
+        partes = urlsplit(url)
+    except ValueError:
+        return False
+    return partes.scheme.lower() in ESQUEMAS_CALLBACK and bool(partes.hostname)
+
+
+class CallbackDispatcher(metaclass=Singleton):
+    """
+    Delivers the flexibilization responses to the `callbackUrl` given
+    in the requests, through a single connection-pooled aiohttp session.
+    The number of deliveries in progress is bounded and failed ones are
+    retried with exponential backoff (and jitter).
+    """
+
+    def __init__(self):
+        self.__max_concurrent = Settings.callback_max_concurrent
+        self.__retries = Settings.callback_retries
+        self.__backoff = Settings.callback_backoff
+        self.__timeout = Settings.callback_timeout
+        self.__session: Optional[aiohttp.ClientSession] = None
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__tasks: Set[asyncio.Task] = set()
+
+    def __sessao(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.__max_concurrent),
+                timeout=aiohttp.ClientTimeout(total=self.__timeout),
+            )
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrent)
+        return self.__session
+
+    async def __tentativa(self, url: str, content: bytes) -> Optional[str]:
+        headers = {
+            "Content-Type": "application/json",
+            REQUEST_ID_HEADER: request_id.get(),
+        }
+        try:
+            async with self.__sessao().post(
+                url, data=content, headers=headers
+            ) as resposta:
+                await resposta.read()
+                if resposta.status < 400:
+                    return None
+                erro = f"HTTP {resposta.status}"
+                if resposta.status not in STATUS_RETENTATIVA:
+                    raise ValueError(erro)
+                return erro
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return f"{type(e).__name__}: {e}"
+
+    async def send(self, url: str, content: bytes) -> bool:
+        """
+        POSTs the JSON `content` to `url`, retrying on connection errors
+        and transient responses. Returns whether it was delivered.
+        """
+        if not valid_callback_url(url):
+            Metrics.increment("callback_failed_total")
+            Log.log().error(f"URL de callback inválida: {url}")
+            return False
+        erro = None
+        for tentativa in range(self.__retries + 1):
+            if tentativa > 0:
+                Metrics.increment("callback_retries_total")
+                espera = self.__backoff * 2 ** (tentativa - 1)
+                await asyncio.sleep(espera * (0.5 + random.random()))
+            self.__sessao()
+            assert self.__semaphore is not None
+            try:
+                # O semáforo não é mantido durante as esperas entre as
+                # tentativas, para não atrasar as demais entregas
+                async with self.__semaphore:
+                    erro = await self.__tentativa(url, content)
+            except ValueError as e:
+                erro = str(e)
+                break
+            if erro is None:
+                Metrics.increment("callback_sent_total")
+                return True
+            Log.log().warning(
+                f"Falha no envio do resultado para {url}"
+                + f" (tentativa {tentativa + 1}): {erro}"
+            )
+        Metrics.increment("callback_failed_total")
+        Log.log().error(f"Resultado não entregue para {url}: {erro}")
+        return False
+
+    def submit(self, coro) -> asyncio.Task:
+        """
+        Runs a coroutine (the pipeline followed by the delivery of its
+        result) in background, keeping a reference to it until it ends.
+        """
+        task = asyncio.create_task(coro)
+        bind_task(task)
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+        return task
+
+    async def close(self):
+        if len(self.__tasks) > 0:
+            await asyncio.gather(*self.__tasks, return_exceptions=True)
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
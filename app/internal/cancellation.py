@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Optional
+
+from fastapi import Request
+
+from app.internal.settings import Settings
+from app.utils.metrics import Metrics
+
+
+class PipelineCancelledError(Exception):
+    def __init__(self, detail: str, code: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.code = code
+
+
+class CancellationToken:
+    """
+    Cancellation state of a flexibilization pipeline, checked between
+    its stages (also from worker threads). The pipeline is cancelled
+    when the client disconnects or when the request deadline expires.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = (
+            time.monotonic() + timeout if timeout is not None else None
+        )
+        self.__cancelled = False
+
+    def cancel(self):
+        self.__cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        return self.__cancelled
+
+    def check(self, stage: str = ""):
+        if self.__cancelled:
+            Metrics.increment("pipeline_disconnected_total")
+            raise PipelineCancelledError(
+                f"Cliente desconectado ({stage})", 499
+            )
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            Metrics.increment("pipeline_deadline_exceeded_total")
+            raise PipelineCancelledError(
+                f"Prazo da requisição esgotado ({stage})", 504
+            )
+
+    async def watch(self, request: Request, interval: float):
+        """
+        Polls the client connection until it is closed, cancelling the
+        pipeline. Meant to run as a task for the duration of a request.
+        """
+        while not self.__cancelled:
+            if await request.is_disconnected():
+                self.cancel()
+                return
+            await asyncio.sleep(interval)
+
+
+def request_token(timeout: Optional[float]) -> CancellationToken:
+    """
+    Token for a request, with its own timeout (in seconds) or the
+    default one from the settings (no deadline when zero).
+    """
+    if timeout is None and Settings.request_timeout > 0:
+        timeout = Settings.request_timeout
+    return CancellationToken(timeout)
+
+
+def check_cancellation(token: Optional[CancellationToken], stage: str):
+    if token is not None:
+        token.check(stage)
@@ -1,5 +1,10 @@
+from datetime import datetime
 from pathlib import Path
+from typing import Optional, Tuple
+import filecmp
 import os
+import re
+import shutil
 
 
 class set_directory:
@@ -17,3 +22,66 @@ class set_directory:
 
     def __exit__(self, *args, **kwargs):
         os.chdir(self.origin)
+
+
+# Sufixo das versões mantidas por snapshot()
+VERSAO = re.compile(r"\.\d{8}T\d{12}")
+
+# Caminho, tamanho e instante de modificação (ns) de um arquivo
+FileState = Tuple[str, int, int]
+
+
+def file_state(path: str) -> FileState:
+    estado = os.stat(path)
+    return (path, estado.st_size, estado.st_mtime_ns)
+
+
+def unchanged(state: FileState) -> bool:
+    try:
+        return file_state(state[0]) == state
+    except FileNotFoundError:
+        return False
+
+
+def snapshot(path: str, directory: str, keep: int) -> Optional[Path]:
+    """
+    Keeps a snapshot of a file in a versions directory, by hardlinking
+    it when possible (O(1), valid since files are replaced and never
+    rewritten in place) or by copying it otherwise. Only the `keep`
+    most recent snapshots of each file are kept.
+    """
+    origem = Path(path)
+    if not origem.is_file():
+        return None
+    versoes = Path(directory)
+    versoes.mkdir(parents=True, exist_ok=True)
+    instante = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    destino = versoes.joinpath(f"{origem.name}.{instante}")
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copy2(origem, destino)
+    anteriores = sorted(
+        v
+        for v in versoes.glob(f"{origem.name}.*")
+        if VERSAO.fullmatch(v.name, len(origem.name))
+    )
+    for antiga in anteriores[: max(0, len(anteriores) - keep)]:
+        antiga.unlink()
+    return destino
+
+
+def same_content(a: str, b: str) -> bool:
+    return os.path.isfile(b) and filecmp.cmp(a, b, shallow=False)
+
+
+def restore(snapshot_path: str, path: str):
+    """
+    Restores a snapshot over a file, atomically.
+    """
+    temporario = f"{path}.{os.getpid()}.restore"
+    try:
+        os.link(snapshot_path, temporario)
+    except OSError:
+        shutil.copy2(snapshot_path, temporario)
+    os.replace(temporario, path)
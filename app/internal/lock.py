@@ -0,0 +1,108 @@
+import asyncio
+import fcntl
+import time
+from pathlib import Path
+from typing import IO, Optional
+
+from app.utils.metrics import Metrics
+
+
+class LockTimeoutError(TimeoutError):
+    pass
+
+
+class case_lock:
+    """
+    Advisory lock over a case directory, shared between processes
+    (and service instances) through `fcntl.flock` on a lock file.
+    Shared locks are held by read-only operations, which may run
+    concurrently with each other but not with an exclusive holder.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        filename: str,
+        timeout: float,
+        poll_interval: float,
+        shared: bool = False,
+    ):
+        self.path = Path(path).joinpath(filename)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        self.__file: Optional[IO] = None
+
+    def __open(self) -> bool:
+        # Os bloqueios compartilhados não criam o arquivo: se ele não
+        # existe, o caso ainda não foi escrito pelo serviço, e as
+        # escritas substituem os arquivos atomicamente
+        if self.mode == fcntl.LOCK_SH:
+            try:
+                self.__file = open(self.path, "r")
+            except FileNotFoundError:
+                return False
+        else:
+            self.__file = open(self.path, "a")
+        return True
+
+    def __try_lock(self) -> bool:
+        assert self.__file is not None
+        try:
+            fcntl.flock(self.__file.fileno(), self.mode | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def __on_timeout(self, waited: float):
+        self.release()
+        Metrics.increment("lock_timeouts_total")
+        Metrics.observe("lock_wait_seconds", waited)
+        raise LockTimeoutError(
+            f"Caso {self.path.parent} bloqueado por outro processo"
+            + f" após {waited:.1f} s de espera"
+        )
+
+    def __on_acquire(self, waited: float):
+        Metrics.increment("lock_acquired_total")
+        Metrics.observe("lock_wait_seconds", waited)
+
+    def acquire(self):
+        if not self.__open():
+            return
+        start = time.monotonic()
+        while not self.__try_lock():
+            waited = time.monotonic() - start
+            if waited >= self.timeout:
+                self.__on_timeout(waited)
+            time.sleep(self.poll_interval)
+        self.__on_acquire(time.monotonic() - start)
+
+    async def acquire_async(self):
+        if not self.__open():
+            return
+        start = time.monotonic()
+        while not self.__try_lock():
+            waited = time.monotonic() - start
+            if waited >= self.timeout:
+                self.__on_timeout(waited)
+            await asyncio.sleep(self.poll_interval)
+        self.__on_acquire(time.monotonic() - start)
+
+    def release(self):
+        if self.__file is not None:
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *args, **kwargs):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+
+    async def __aexit__(self, *args, **kwargs):
+        self.release()
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.internal.requestid import task_request_id
+from app.utils.log import Log
+from app.utils.metrics import Metrics
+
+
+class LoopMonitor:
+    """
+    Samples the event loop lag (the delay of a periodic timer) into the
+    `loop_lag_seconds` histogram. When a blocking threshold is given, a
+    watchdog thread also logs the stack of any loop step that blocks
+    the loop for longer than it, along with the id of the request being
+    served by the running task.
+    """
+
+    def __init__(self, interval: float, block_threshold: float = 0.0):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__thread_id: Optional[int] = None
+        self.__heartbeat = time.monotonic()
+        self.__task: Optional[asyncio.Task] = None
+        self.__stop = threading.Event()
+        self.__watchdog: Optional[threading.Thread] = None
+
+    async def __sample(self):
+        while True:
+            inicio = time.monotonic()
+            await asyncio.sleep(self.interval)
+            agora = time.monotonic()
+            atraso = max(0.0, agora - inicio - self.interval)
+            self.__heartbeat = agora
+            Metrics.observe("loop_lag_seconds", atraso)
+            Metrics.set_gauge("loop_lag_last_seconds", atraso)
+
+    def __watch(self):
+        reportado = 0.0
+        while not self.__stop.wait(self.block_threshold / 4):
+            batimento = self.__heartbeat
+            atraso = time.monotonic() - batimento - self.interval
+            if atraso < self.block_threshold or reportado == batimento:
+                continue
+            reportado = batimento
+            assert self.__thread_id is not None
+            frame = sys._current_frames().get(self.__thread_id)
+            if frame is None:
+                continue
+            pilha = "".join(traceback.format_stack(frame))
+            # Leitura sem sincronização da task em execução no loop
+            tarefa = asyncio.current_task(self.__loop)
+            Metrics.increment("loop_blocked_total")
+            Log.log().warning(
+                f"Event loop bloqueado há {atraso:.3f} s"
+                + f" (requisição {task_request_id(tarefa)}):\n{pilha}"
+            )
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self.__loop = asyncio.get_running_loop()
+        self.__thread_id = threading.get_ident()
+        self.__heartbeat = time.monotonic()
+        self.__task = asyncio.create_task(self.__sample())
+        if self.block_threshold > 0:
+            self.__stop.clear()
+            self.__watchdog = threading.Thread(
+                target=self.__watch, name="loop-watchdog", daemon=True
+            )
+            self.__watchdog.start()
+
+    async def stop(self):
+        self.__stop.set()
+        if self.__task is not None:
+            self.__task.cancel()
+            await asyncio.gather(self.__task, return_exceptions=True)
+            self.__task = None
+        if self.__watchdog is not None:
+            self.__watchdog.join()
+            self.__watchdog = None
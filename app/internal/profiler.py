@@ -0,0 +1,142 @@
+import sys
+import threading
+import time
+from collections import Counter, deque
+from os.path import basename, relpath
+from typing import Deque, Optional, Tuple
+
+from app.internal.settings import Settings
+from app.utils.singleton import Singleton
+
+# Funções (arquivo, nome) em que as threads aguardam sem processar,
+# omitidas dos perfis por padrão
+FUNCOES_OCIOSAS = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+}
+
+Pilha = Tuple[str, bool]
+
+
+def _arquivo(caminho: str) -> str:
+    if "site-packages" in caminho:
+        return caminho.split("site-packages", 1)[1].lstrip("/\\")
+    if caminho.startswith(Settings.installdir):
+        return relpath(caminho, Settings.installdir)
+    return basename(caminho)
+
+
+def _colapsa(frame, thread: str) -> Pilha:
+    """
+    Collapses a stack into the `root;...;leaf` form of the flamegraph
+    tools, returning it along with whether the thread is idle.
+    """
+    funcoes = []
+    folha = frame.f_code
+    while frame is not None:
+        codigo = frame.f_code
+        funcoes.append(
+            f"{codigo.co_name} ({_arquivo(codigo.co_filename)}"
+            + f":{frame.f_lineno})"
+        )
+        frame = frame.f_back
+    funcoes.append(thread)
+    ociosa = (basename(folha.co_filename), folha.co_name) in FUNCOES_OCIOSAS
+    return ";".join(reversed(funcoes)), ociosa
+
+
+def _amostra() -> "Counter[Pilha]":
+    propria = threading.get_ident()
+    nomes = {t.ident: t.name for t in threading.enumerate()}
+    pilhas: "Counter[Pilha]" = Counter()
+    for ident, frame in sys._current_frames().items():
+        if ident != propria:
+            pilhas[_colapsa(frame, nomes.get(ident, str(ident)))] += 1
+    return pilhas
+
+
+def collapsed(pilhas: "Counter[Pilha]", idle: bool = False) -> str:
+    linhas = [
+        f"{pilha} {n}"
+        for (pilha, ociosa), n in pilhas.most_common()
+        if idle or not ociosa
+    ]
+    return "\n".join(linhas) + "\n" if linhas else ""
+
+
+class SamplingProfiler(metaclass=Singleton):
+    """
+    Low-frequency sampling profiler of every thread of the service.
+    When running continuously, a background thread samples the stacks
+    every `interval` seconds and keeps them aggregated per second over
+    the last `window` seconds, so that the profile of the recent
+    traffic can be obtained at any time. Otherwise, profiles are
+    sampled on demand.
+    """
+
+    def __init__(self):
+        self.interval = Settings.profiler_interval
+        self.window = Settings.profiler_window
+        self.continuous = Settings.profiler_continuous
+        self.__lock = threading.Lock()
+        self.__segundos: Deque[Tuple[int, "Counter[Pilha]"]] = deque()
+        self.__stop = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            amostra = _amostra()
+            segundo = int(time.monotonic())
+            with self.__lock:
+                if not self.__segundos or self.__segundos[-1][0] != segundo:
+                    self.__segundos.append((segundo, Counter()))
+                self.__segundos[-1][1].update(amostra)
+                while self.__segundos[0][0] <= segundo - self.window:
+                    self.__segundos.popleft()
+
+    def recent(self, seconds: float) -> "Counter[Pilha]":
+        """
+        Aggregates the stacks sampled in the last `seconds` seconds.
+        """
+        limite = time.monotonic() - seconds
+        pilhas: "Counter[Pilha]" = Counter()
+        with self.__lock:
+            for segundo, amostras in self.__segundos:
+                if segundo + 1 > limite:
+                    pilhas.update(amostras)
+        return pilhas
+
+    def sample(self, seconds: float) -> "Counter[Pilha]":
+        """
+        Samples the stacks for the next `seconds` seconds (blocking the
+        calling thread).
+        """
+        pilhas: "Counter[Pilha]" = Counter()
+        fim = time.monotonic() + seconds
+        while time.monotonic() < fim:
+            pilhas.update(_amostra())
+            time.sleep(max(self.interval, 0.01))
+        return pilhas
+
+    def start(self):
+        if not self.continuous or self.interval <= 0:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, name="profiler", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
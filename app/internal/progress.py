@@ -0,0 +1,33 @@
+import asyncio
+from typing import Callable, Optional
+
+# Recebe o nome do evento e os seus dados
+ProgressCallback = Callable[[str, dict], None]
+
+
+def notify(callback: Optional[ProgressCallback], event: str, **data):
+    if callback is not None:
+        callback(event, data)
+
+
+class ProgressQueue:
+    """
+    Bridges progress events, which may be emitted from worker threads,
+    to an asyncio queue consumed by the streaming responses. A `None`
+    item marks the end of the stream.
+    """
+
+    def __init__(self):
+        self.__loop = asyncio.get_running_loop()
+        self.__queue: asyncio.Queue = asyncio.Queue()
+
+    def __call__(self, event: str, data: dict):
+        self.__loop.call_soon_threadsafe(
+            self.__queue.put_nowait, (event, data)
+        )
+
+    def close(self):
+        self.__loop.call_soon_threadsafe(self.__queue.put_nowait, None)
+
+    async def get(self):
+        return await self.__queue.get()
@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+import weakref
+from contextvars import ContextVar
+from typing import Optional
+
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Identificadores das requisições atendidas por cada task, para consulta
+# a partir de outras threads (onde as ContextVars do loop não são
+# acessíveis)
+_tasks: "weakref.WeakKeyDictionary[asyncio.Task, str]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def bind_task(task: Optional[asyncio.Task] = None):
+    """
+    Associates a task (the current one by default) to the current
+    request id.
+    """
+    task = task if task is not None else asyncio.current_task()
+    if task is not None:
+        _tasks[task] = request_id.get()
+
+
+def task_request_id(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return "-"
+    return _tasks.get(task, "-")
+
+
+class RequestIdMiddleware:
+    """
+    Assigns an id to each HTTP request, taken from the `X-Request-ID`
+    header or generated, and echoes it in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers", []))
+        rid = headers.get(REQUEST_ID_HEADER.encode(), b"").decode()
+        if not rid:
+            rid = uuid.uuid4().hex[:16]
+        token = request_id.set(rid)
+        bind_task()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER.encode(), rid.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
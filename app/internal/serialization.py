@@ -0,0 +1,143 @@
+import gzip
+from typing import Iterable, List, Optional, Tuple
+
+import orjson
+
+from app.models.dadgerdiff import DadgerDiffRecord
+from app.models.dadgerpatch import DadgerPatch
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.models.flexibilizationvariant import FlexibilizationVariantRecord
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+
+def _record_to_dict(r: FlexibilizationRecord) -> dict:
+    # Equivalente à validação de FlexibilizationResult, feita uma única
+    # vez na serialização da resposta
+    return {
+        "flexType": None if r.flexType is None else str(r.flexType),
+        "flexStage": None if r.flexStage is None else int(r.flexStage),
+        "flexCode": None if r.flexCode is None else int(r.flexCode),
+        "flexPatamar": None if r.flexPatamar is None else str(r.flexPatamar),
+        "flexLimit": None if r.flexLimit is None else str(r.flexLimit),
+        "flexSubsystem": (
+            None if r.flexSubsystem is None else str(r.flexSubsystem)
+        ),
+        "flexAmount": None if r.flexAmount is None else float(r.flexAmount),
+    }
+
+
+def records_to_dicts(records: Iterable[FlexibilizationRecord]) -> List[dict]:
+    return [_record_to_dict(r) for r in records]
+
+
+def response_json(
+    records: Iterable[FlexibilizationRecord],
+    diff: Optional[Iterable[DadgerDiffRecord]] = None,
+) -> bytes:
+    """
+    Serializes the records (and the dadger diff of a dry run) as a
+    FlexibilizationResponse JSON document.
+    """
+    content: dict = {"result": records_to_dicts(records)}
+    if diff is not None:
+        content["diff"] = [d._asdict() for d in diff]
+    return orjson.dumps(content)
+
+
+def variants_json(variants: Iterable[FlexibilizationVariantRecord]) -> bytes:
+    """
+    Serializes the variants results as a FlexibilizationVariantsResponse
+    JSON document.
+    """
+    content = {
+        "variants": [
+            {
+                "name": v.name,
+                "directory": v.directory,
+                "result": records_to_dicts(v.result),
+            }
+            for v in variants
+        ]
+    }
+    return orjson.dumps(content)
+
+
+def dadger_patch_json(patch: DadgerPatch) -> bytes:
+    content = {
+        "version": patch.version,
+        "file": patch.file,
+        "encoding": patch.encoding,
+        "base": patch.base,
+        "result": patch.result,
+        "changes": [
+            {"line": c.line, "op": c.op, "content": c.content}
+            for c in patch.changes
+        ],
+    }
+    return orjson.dumps(content)
+
+
+def error_json(code: int, detail: str) -> bytes:
+    return orjson.dumps({"code": code, "detail": detail})
+
+
+def progress_event(event: str, data: dict, sse: bool = False) -> bytes:
+    """
+    Serializes a progress event as a NDJSON line or as a Server-Sent
+    Event, converting the flexibilization records and diffs it carries.
+    """
+    content = dict(data)
+    if "result" in content:
+        content["result"] = records_to_dicts(content["result"])
+    if "diff" in content:
+        content["diff"] = [d._asdict() for d in content["diff"]]
+    if sse:
+        return b"event: %s\ndata: %s\n\n" % (
+            event.encode(),
+            orjson.dumps(content),
+        )
+    return orjson.dumps({"event": event, **content}) + b"\n"
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+    if not accept_encoding:
+        return []
+    encodings = []
+    for item in accept_encoding.split(","):
+        partes = item.strip().split(";")
+        nome = partes[0].strip().lower()
+        q = 1.0
+        for p in partes[1:]:
+            p = p.strip()
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            encodings.append(nome)
+    return encodings
+
+
+def compress(
+    content: bytes, accept_encoding: Optional[str], min_size: int
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Compresses the content with the best encoding accepted by the
+    client (brotli, when available, or gzip).
+
+    :return: The (possibly) compressed content and its encoding
+    :rtype: Tuple[bytes, Optional[str]]
+    """
+    if len(content) < min_size:
+        return content, None
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in encodings:
+        return brotli.compress(content, quality=4), "br"
+    if "gzip" in encodings or "*" in encodings:
+        return gzip.compress(content, compresslevel=5), "gzip"
+    return content, None
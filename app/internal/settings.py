@@ -10,6 +10,66 @@ class Settings:
     root_path = os.getenv("ROOT_PATH", "/")
     encoding_script = "app/static/converte_utf8.sh"
     uri_pattern = os.getenv("URI_PATTERN", "BASE62")
+    lock_file = os.getenv("LOCK_FILE", ".flexibilizador.lock")
+    lock_timeout = float(os.getenv("LOCK_TIMEOUT", "60"))
+    lock_poll_interval = float(os.getenv("LOCK_POLL_INTERVAL", "0.5"))
+    history_file = os.getenv("HISTORY_FILE", ".flexibilizador.sqlite3")
+    flex_policy = os.getenv("FLEX_POLICY", "ABSOLUTE")
+    adaptive_growth_factor = float(os.getenv("ADAPTIVE_GROWTH_FACTOR", "2"))
+    adaptive_max_factor = float(os.getenv("ADAPTIVE_MAX_FACTOR", "16"))
+    export_parquet = os.getenv("EXPORT_PARQUET", "0") == "1"
+    export_directory = os.getenv("EXPORT_DIRECTORY", "flexibilizador")
+    compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    cache_directory = os.getenv("CACHE_DIRECTORY", "")
+    cache_max_size = int(os.getenv("CACHE_MAX_SIZE", str(1 << 30)))
+    admission_max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", "4"))
+    admission_max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+    admission_queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+    admission_retry_after = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))
+
+    versions_directory = os.getenv(
+        "VERSIONS_DIRECTORY", ".flexibilizador_versoes"
+    )
+    versions_keep = int(os.getenv("VERSIONS_KEEP", "10"))
+
+    dadger_patch = os.getenv("DADGER_PATCH", "1") == "1"
+
+    watch_roots = os.getenv("WATCH_ROOTS", "")
+    watch_debounce = float(os.getenv("WATCH_DEBOUNCE", "5"))
+    watch_poll_interval = float(os.getenv("WATCH_POLL_INTERVAL", "10"))
+    watch_polling = os.getenv("WATCH_POLLING", "0") == "1"
+    watch_precompute = os.getenv("WATCH_PRECOMPUTE", "1") == "1"
+    watch_max_plans = int(os.getenv("WATCH_MAX_PLANS", "32"))
+
+    request_timeout = float(os.getenv("REQUEST_TIMEOUT", "0"))
+    disconnect_poll_interval = float(
+        os.getenv("DISCONNECT_POLL_INTERVAL", "0.5")
+    )
+
+    loop_lag_interval = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+    loop_block_threshold = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0"))
+
+    admission_priority_classes = os.getenv(
+        "ADMISSION_PRIORITY_CLASSES", "OFFICIAL,DEFAULT,STUDY"
+    )
+    admission_default_priority = os.getenv(
+        "ADMISSION_DEFAULT_PRIORITY", "DEFAULT"
+    )
+    admission_aging = float(os.getenv("ADMISSION_AGING", "60"))
+
+    callback_max_concurrent = int(os.getenv("CALLBACK_MAX_CONCURRENT", "8"))
+    callback_retries = int(os.getenv("CALLBACK_RETRIES", "5"))
+    callback_backoff = float(os.getenv("CALLBACK_BACKOFF", "1"))
+    callback_timeout = float(os.getenv("CALLBACK_TIMEOUT", "30"))
+
+    session_max_cases = int(os.getenv("SESSION_MAX_CASES", "16"))
+    session_max_bytes = int(os.getenv("SESSION_MAX_BYTES", str(1 << 29)))
+
+    export_dadger_patch = os.getenv("EXPORT_DADGER_PATCH", "0") == "1"
+
+    profiler_interval = float(os.getenv("PROFILER_INTERVAL", "0.05"))
+    profiler_window = float(os.getenv("PROFILER_WINDOW", "300"))
+    profiler_continuous = os.getenv("PROFILER_CONTINUOUS", "1") == "1"
 
     @classmethod
     def read_environments(cls):
@@ -21,3 +81,69 @@ class Settings:
         cls.root_path = os.getenv("ROOT_PATH", "/")
         cls.encoding_script = "app/static/converte_utf8.sh"
         cls.uri_pattern = os.getenv("URI_PATTERN", "BASE62")
+        cls.lock_file = os.getenv("LOCK_FILE", ".flexibilizador.lock")
+        cls.lock_timeout = float(os.getenv("LOCK_TIMEOUT", "60"))
+        cls.lock_poll_interval = float(os.getenv("LOCK_POLL_INTERVAL", "0.5"))
+        cls.history_file = os.getenv("HISTORY_FILE", ".flexibilizador.sqlite3")
+        cls.flex_policy = os.getenv("FLEX_POLICY", "ABSOLUTE")
+        cls.adaptive_growth_factor = float(
+            os.getenv("ADAPTIVE_GROWTH_FACTOR", "2")
+        )
+        cls.adaptive_max_factor = float(os.getenv("ADAPTIVE_MAX_FACTOR", "16"))
+        cls.export_parquet = os.getenv("EXPORT_PARQUET", "0") == "1"
+        cls.export_directory = os.getenv("EXPORT_DIRECTORY", "flexibilizador")
+        cls.compression_min_size = int(
+            os.getenv("COMPRESSION_MIN_SIZE", "1024")
+        )
+        cls.cache_directory = os.getenv("CACHE_DIRECTORY", "")
+        cls.cache_max_size = int(os.getenv("CACHE_MAX_SIZE", str(1 << 30)))
+        cls.admission_max_concurrent = int(
+            os.getenv("ADMISSION_MAX_CONCURRENT", "4")
+        )
+        cls.admission_max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+        cls.admission_queue_timeout = float(
+            os.getenv("ADMISSION_QUEUE_TIMEOUT", "30")
+        )
+        cls.admission_retry_after = int(
+            os.getenv("ADMISSION_RETRY_AFTER", "30")
+        )
+        cls.versions_directory = os.getenv(
+            "VERSIONS_DIRECTORY", ".flexibilizador_versoes"
+        )
+        cls.versions_keep = int(os.getenv("VERSIONS_KEEP", "10"))
+        cls.dadger_patch = os.getenv("DADGER_PATCH", "1") == "1"
+        cls.watch_roots = os.getenv("WATCH_ROOTS", "")
+        cls.watch_debounce = float(os.getenv("WATCH_DEBOUNCE", "5"))
+        cls.watch_poll_interval = float(os.getenv("WATCH_POLL_INTERVAL", "10"))
+        cls.watch_polling = os.getenv("WATCH_POLLING", "0") == "1"
+        cls.watch_precompute = os.getenv("WATCH_PRECOMPUTE", "1") == "1"
+        cls.watch_max_plans = int(os.getenv("WATCH_MAX_PLANS", "32"))
+        cls.request_timeout = float(os.getenv("REQUEST_TIMEOUT", "0"))
+        cls.disconnect_poll_interval = float(
+            os.getenv("DISCONNECT_POLL_INTERVAL", "0.5")
+        )
+        cls.loop_lag_interval = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+        cls.loop_block_threshold = float(
+            os.getenv("LOOP_BLOCK_THRESHOLD", "0")
+        )
+        cls.admission_priority_classes = os.getenv(
+            "ADMISSION_PRIORITY_CLASSES", "OFFICIAL,DEFAULT,STUDY"
+        )
+        cls.admission_default_priority = os.getenv(
+            "ADMISSION_DEFAULT_PRIORITY", "DEFAULT"
+        )
+        cls.admission_aging = float(os.getenv("ADMISSION_AGING", "60"))
+        cls.callback_max_concurrent = int(
+            os.getenv("CALLBACK_MAX_CONCURRENT", "8")
+        )
+        cls.callback_retries = int(os.getenv("CALLBACK_RETRIES", "5"))
+        cls.callback_backoff = float(os.getenv("CALLBACK_BACKOFF", "1"))
+        cls.callback_timeout = float(os.getenv("CALLBACK_TIMEOUT", "30"))
+        cls.session_max_cases = int(os.getenv("SESSION_MAX_CASES", "16"))
+        cls.session_max_bytes = int(
+            os.getenv("SESSION_MAX_BYTES", str(1 << 29))
+        )
+        cls.export_dadger_patch = os.getenv("EXPORT_DADGER_PATCH", "0") == "1"
+        cls.profiler_interval = float(os.getenv("PROFILER_INTERVAL", "0.05"))
+        cls.profiler_window = float(os.getenv("PROFILER_WINDOW", "300"))
+        cls.profiler_continuous = os.getenv("PROFILER_CONTINUOUS", "1") == "1"
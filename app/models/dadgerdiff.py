@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import NamedTuple, Optional
+
+
+class DadgerDiff(BaseModel):
+    """
+    Class for defining a record-level change made on the dadger.
+    """
+
+    line: Optional[int]
+    record: str
+    before: Optional[str]
+    after: Optional[str]
+
+
+class DadgerDiffRecord(NamedTuple):
+    """
+    Lightweight internal form of a DadgerDiff.
+    """
+
+    line: Optional[int]
+    record: str
+    before: Optional[str]
+    after: Optional[str]
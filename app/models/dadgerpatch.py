@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+# Versão do formato dos patches do dadger
+DADGER_PATCH_VERSION = 1
+
+
+class DadgerPatchChange(BaseModel):
+    """
+    Class for defining a change of a dadger patch: a line of the base
+    file (1-based) is replaced or deleted, or lines are inserted before
+    it.
+    """
+
+    line: int
+    op: str
+    content: Optional[str] = None
+
+
+class DadgerPatch(BaseModel):
+    """
+    Class for defining a compact patch of the dadger, which replicates
+    a flexibilization on another copy of the same case. The base and
+    the resulting files are identified by their content hashes.
+    """
+
+    version: int = DADGER_PATCH_VERSION
+    file: str
+    encoding: str
+    base: str
+    result: str
+    changes: List[DadgerPatchChange]
@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from typing import List
+
+from app.models.flexibilizationresult import FlexibilizationResult
+
+
+class FlexibilizationHistoryRound(BaseModel):
+    """
+    Class for defining the flexibilizations applied to a case in
+    a given round.
+    """
+
+    round: int
+    timestamp: str
+    result: List[FlexibilizationResult]
+
+
+class FlexibilizationHistoryResponse(BaseModel):
+    """
+    Class for defining the flexibilization history of a case.
+    """
+
+    rounds: List[FlexibilizationHistoryRound]
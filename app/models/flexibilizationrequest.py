@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+
+from app.models.flexibilizationrule import FlexibilizationRule
 
 
 class FlexibilizationRequest(BaseModel):
@@ -9,4 +11,8 @@ class FlexibilizationRequest(BaseModel):
 
     id: str
     program: Optional[str]
-    # rules: List[FlexibilizationRule]
+    rules: List[FlexibilizationRule] = []
+    dryRun: bool = False
+    timeout: Optional[float] = None
+    priority: Optional[str] = None
+    callbackUrl: Optional[str] = None
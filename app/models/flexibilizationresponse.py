@@ -1,6 +1,7 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
+from app.models.dadgerdiff import DadgerDiff
 from app.models.flexibilizationresult import FlexibilizationResult
 
 
@@ -10,3 +11,4 @@ class FlexibilizationResponse(BaseModel):
     """
 
     result: List[FlexibilizationResult]
+    diff: Optional[List[DadgerDiff]] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import NamedTuple, Optional
 
 
 class FlexibilizationResult(BaseModel):
@@ -14,3 +14,18 @@ class FlexibilizationResult(BaseModel):
     flexLimit: Optional[str]
     flexSubsystem: Optional[str]
     flexAmount: Optional[float]
+
+
+class FlexibilizationRecord(NamedTuple):
+    """
+    Lightweight internal form of a FlexibilizationResult, built without
+    validation and only converted when serialized for the response.
+    """
+
+    flexType: Optional[str]
+    flexStage: Optional[int]
+    flexCode: Optional[int]
+    flexPatamar: Optional[str]
+    flexLimit: Optional[str]
+    flexSubsystem: Optional[str]
+    flexAmount: Optional[float]
@@ -7,10 +7,13 @@ class FlexibilizationRule(BaseModel):
     Class for defining a flexibilization rule for a given program.
     """
 
-    violationType: Optional[str]
-    violationCode: Optional[int]
-    violationAmount: Optional[float]
-    violationUnit: Optional[str]
-    constraintType: Optional[str]
-    constraintCode: Optional[str]
-    flexibilizationFactor: Optional[str]
+    violationType: Optional[str] = None
+    violationCode: Optional[int] = None
+    violationAmount: Optional[float] = None
+    violationUnit: Optional[str] = None
+    constraintType: Optional[str] = None
+    constraintCode: Optional[str] = None
+    flexibilizationFactor: Optional[float] = None
+    flexibilizationDelta: Optional[float] = None
+    flexibilizationCap: Optional[float] = None
+    flexibilizationSkip: Optional[bool] = None
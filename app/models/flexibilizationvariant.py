@@ -0,0 +1,60 @@
+from pydantic import BaseModel
+from typing import List, NamedTuple, Optional
+
+from app.models.flexibilizationresult import (
+    FlexibilizationRecord,
+    FlexibilizationResult,
+)
+from app.models.flexibilizationrule import FlexibilizationRule
+
+
+class FlexibilizationVariant(BaseModel):
+    """
+    Class for defining a variant of a case, flexibilized with its own
+    rules and written to its own directory.
+    """
+
+    name: str
+    rules: List[FlexibilizationRule] = []
+    directory: Optional[str] = None
+
+
+class FlexibilizationVariantsRequest(BaseModel):
+    """
+    Class for defining a request for flexibilizing several variants of
+    a given case.
+    """
+
+    id: str
+    program: Optional[str]
+    variants: List[FlexibilizationVariant]
+    timeout: Optional[float] = None
+    priority: Optional[str] = None
+
+
+class FlexibilizationVariantResult(BaseModel):
+    """
+    Class for defining the flexibilization result of a variant.
+    """
+
+    name: str
+    directory: str
+    result: List[FlexibilizationResult]
+
+
+class FlexibilizationVariantRecord(NamedTuple):
+    """
+    Internal form of a FlexibilizationVariantResult.
+    """
+
+    name: str
+    directory: str
+    result: List[FlexibilizationRecord]
+
+
+class FlexibilizationVariantsResponse(BaseModel):
+    """
+    Class for defining the flexibilization results of the variants.
+    """
+
+    variants: List[FlexibilizationVariantResult]
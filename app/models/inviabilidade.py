@@ -1,8 +1,24 @@
 from abc import abstractmethod
+from typing import Optional, Protocol
 import numpy as np
 import pandas as pd  # type: ignore
-from idecomp.decomp.hidr import Hidr
-from idecomp.decomp.relato import Relato
+
+from app.utils.hidr import HidrMemmap
+
+
+class RelatoTables(Protocol):
+    """
+    Tables of the relato used by the violations, provided both by
+    `idecomp.decomp.relato.Relato` and by the cached `CachedRelato`.
+    """
+
+    @property
+    def dados_mercado(self) -> Optional[pd.DataFrame]: ...
+
+    @property
+    def energia_armazenada_maxima_submercado(
+        self,
+    ) -> Optional[pd.DataFrame]: ...
 
 
 class Inviabilidade:
@@ -31,7 +47,9 @@ class Inviabilidade:
 
     @staticmethod
     def factory(
-        linha_inviab_unic: pd.Series, hidr: Hidr, relato: Relato
+        linha_inviab_unic: pd.Series,
+        hidr: HidrMemmap,
+        relato: RelatoTables,
     ) -> "Inviabilidade":
         if "iteracao" in list(linha_inviab_unic.index):
             iteracao = int(linha_inviab_unic["iteracao"])
@@ -145,7 +163,7 @@ class InviabilidadeTI(Inviabilidade):
         mensagem_restricao: str,
         violacao: float,
         unidade: str,
-        hidr: Hidr,
+        hidr: HidrMemmap,
     ):
         super().__init__(
             iteracao, estagio, cenario, mensagem_restricao, violacao, unidade
@@ -163,13 +181,9 @@ class InviabilidadeTI(Inviabilidade):
         )
 
     def processa_mensagem(self, *args) -> list:
-        hidr: Hidr = args[0]
+        hidr: HidrMemmap = args[0]
         nome = self._mensagem_restricao.split("IRRIGACAO, USINA")[1].strip()
-        codigo = int(
-            list(
-                hidr.cadastro.loc[hidr.cadastro["nome_usina"] == nome, :].index
-            )[0]
-        )
+        codigo = hidr.codigo_usina(nome)
         return [codigo, nome]
 
 
@@ -315,7 +329,7 @@ class InviabilidadeEV(Inviabilidade):
         mensagem_restricao: str,
         violacao: float,
         unidade: str,
-        hidr: Hidr,
+        hidr: HidrMemmap,
     ):
         super().__init__(
             iteracao, estagio, cenario, mensagem_restricao, violacao, unidade
@@ -333,13 +347,9 @@ class InviabilidadeEV(Inviabilidade):
         )
 
     def processa_mensagem(self, *args) -> list:
-        hidr: Hidr = args[0]
+        hidr: HidrMemmap = args[0]
         nome = self._mensagem_restricao.split("EVAPORACAO, USINA")[1].strip()
-        codigo = int(
-            list(
-                hidr.cadastro.loc[hidr.cadastro["nome_usina"] == nome, :].index
-            )[0]
-        )
+        codigo = hidr.codigo_usina(nome)
         return [codigo, nome]
 
 
@@ -352,7 +362,7 @@ class InviabilidadeDEFMIN(Inviabilidade):
         mensagem_restricao: str,
         violacao: float,
         unidade: str,
-        hidr: Hidr,
+        hidr: HidrMemmap,
     ):
         super().__init__(
             iteracao, estagio, cenario, mensagem_restricao, violacao, unidade
@@ -372,24 +382,13 @@ class InviabilidadeDEFMIN(Inviabilidade):
         )
 
     def processa_mensagem(self, *args) -> list:
-        hidr: Hidr = args[0]
+        hidr: HidrMemmap = args[0]
         p = "PATAMAR"
         u = "USINA"
         pat = int(self._mensagem_restricao.split(p)[1].split(u)[0].strip())
         nome = self._mensagem_restricao.split(u)[1].strip()
-        codigo = int(
-            list(
-                hidr.cadastro.loc[hidr.cadastro["nome_usina"] == nome, :].index
-            )[0]
-        )
-        vazmin_hidr = int(
-            list(
-                hidr.cadastro.loc[
-                    hidr.cadastro["nome_usina"] == nome,
-                    "vazao_minima_historica",
-                ]
-            )[0]
-        )
+        codigo = hidr.codigo_usina(nome)
+        vazmin_hidr = hidr.vazao_minima_historica(codigo)
         return [codigo, nome, pat, vazmin_hidr]
 
 
@@ -402,7 +401,7 @@ class InviabilidadeFP(Inviabilidade):
         mensagem_restricao: str,
         violacao: float,
         unidade: str,
-        hidr: Hidr,
+        hidr: HidrMemmap,
     ):
         super().__init__(
             iteracao, estagio, cenario, mensagem_restricao, violacao, unidade
@@ -421,16 +420,12 @@ class InviabilidadeFP(Inviabilidade):
         )
 
     def processa_mensagem(self, *args) -> list:
-        hidr: Hidr = args[0]
+        hidr: HidrMemmap = args[0]
         p = "PATAMAR"
         u = "USINA"
         pat = int(self._mensagem_restricao.split(p)[1])
         nome = self._mensagem_restricao.split(u)[1].split(",")[0].strip()
-        codigo = int(
-            list(
-                hidr.cadastro.loc[hidr.cadastro["nome_usina"] == nome, :].index
-            )[0]
-        )
+        codigo = hidr.codigo_usina(nome)
         return [codigo, nome, pat]
 
 
@@ -443,7 +438,7 @@ class InviabilidadeDeficit(Inviabilidade):
         mensagem_restricao: str,
         violacao: float,
         unidade: str,
-        relato: Relato,
+        relato: RelatoTables,
     ):
         super().__init__(
             iteracao, estagio, cenario, mensagem_restricao, violacao, unidade
@@ -463,7 +458,6 @@ class InviabilidadeDeficit(Inviabilidade):
 
     def processa_mensagem(self, *args) -> list:
         relato = args[0]
-        assert isinstance(relato, Relato)
         msg = self._mensagem_restricao
         subsis = msg.split("SUBSISTEMA ")[1].split(",")[0].strip()
         pat = int(msg.split("PATAMAR")[1].strip())
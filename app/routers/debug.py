@@ -0,0 +1,31 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.internal.profiler import SamplingProfiler, collapsed
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+)
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    idle: bool = False,
+):
+    profiler = SamplingProfiler()
+    # A janela também limita as amostragens sob demanda, que ocupam uma
+    # thread durante todo o período
+    if seconds > profiler.window:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Janela máxima do perfil: {profiler.window} s",
+        )
+    if profiler.running:
+        pilhas = profiler.recent(seconds)
+    else:
+        pilhas = await asyncio.to_thread(profiler.sample, seconds)
+    return PlainTextResponse(collapsed(pilhas, idle))
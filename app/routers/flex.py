@@ -1,13 +1,47 @@
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import orjson
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi import Response
+from fastapi.responses import StreamingResponse
 from app.internal.httpresponse import HTTPResponse
 from app.models.flexibilizationrequest import FlexibilizationRequest
 from app.models.flexibilizationresponse import FlexibilizationResponse
+from app.models.flexibilizationhistory import FlexibilizationHistoryResponse
+from app.models.dadgerpatch import DadgerPatch
+from app.models.flexibilizationvariant import (
+    FlexibilizationVariantsRequest,
+    FlexibilizationVariantsResponse,
+)
 
 from app.adapters.uriparserrepository import AbstractURIParsingRepository
 from app.services.unitofwork import factory as uow_factory
 
 from app.internal.dependencies import uriParser
 from app.adapters.flexibilizationrepository import factory as flex_factory
+from app.adapters.exportrepository import (
+    ARROW_STREAM_MEDIA_TYPE,
+    results_arrow_stream,
+)
+from app.internal.serialization import (
+    compress,
+    dadger_patch_json,
+    error_json,
+    progress_event,
+    response_json,
+    variants_json,
+)
+from app.internal.progress import ProgressQueue
+from app.internal.callback import CallbackDispatcher, valid_callback_url
+from app.internal.cancellation import request_token
+from app.internal.lock import LockTimeoutError
+from app.internal.requestid import bind_task
+from app.internal.admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    estimate_cost,
+)
+from app.internal.settings import Settings
 
 router = APIRouter(
     prefix="/flex",
@@ -15,21 +49,262 @@ router = APIRouter(
 )
 
 
+async def executa_flex(
+    req: FlexibilizationRequest,
+    path: str,
+    progresso=None,
+    cancelamento=None,
+):
+    flex_repo = flex_factory(req.program)
+    uow = uow_factory("FS", path, read_only=req.dryRun)
+    async with AdmissionController().slot(req.priority, estimate_cost(path)):
+        if req.dryRun:
+            return await flex_repo.dry_run(
+                req.rules, uow, progresso, cancelamento
+            )
+        return await flex_repo.flex(req.rules, uow, progresso, cancelamento)
+
+
+async def executa_callback(req: FlexibilizationRequest, path: str, url: str):
+    try:
+        result = await executa_flex(
+            req, path, cancelamento=request_token(req.timeout)
+        )
+    except AdmissionRejectedError as e:
+        result = HTTPResponse(code=429, detail=e.detail)
+    except Exception as e:
+        result = HTTPResponse(code=500, detail=str(e))
+    if isinstance(result, HTTPResponse):
+        content = error_json(result.code, result.detail)
+    elif isinstance(result, tuple):
+        content = response_json(*result)
+    else:
+        content = response_json(result)
+    await CallbackDispatcher().send(url, content)
+
+
 @router.post(
     "/",
     response_model=FlexibilizationResponse,
 )
 async def flexibilize(
     req: FlexibilizationRequest,
+    request: Request,
     uriParser: AbstractURIParsingRepository = Depends(uriParser),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
 ):
     path = uriParser.parse(req.id)
-    flex_repo = flex_factory(req.program)
     if isinstance(path, HTTPResponse):
         raise HTTPException(status_code=path.code, detail=path.detail)
-    uow = uow_factory("FS", path)
-    result = await flex_repo.flex([], uow)
+    if req.callbackUrl:
+        if not valid_callback_url(req.callbackUrl):
+            raise HTTPException(
+                status_code=400,
+                detail="callbackUrl deve ser uma URL http(s) absoluta",
+            )
+        # O resultado é entregue ao callbackUrl ao fim da flexibilização
+        CallbackDispatcher().submit(
+            executa_callback(req, path, req.callbackUrl)
+        )
+        return Response(
+            content=orjson.dumps({"id": req.id}),
+            status_code=202,
+            media_type="application/json",
+        )
+    cancelamento = request_token(req.timeout)
+    monitor = asyncio.create_task(
+        cancelamento.watch(request, Settings.disconnect_poll_interval)
+    )
+    try:
+        result = await executa_flex(req, path, cancelamento=cancelamento)
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    finally:
+        monitor.cancel()
     if isinstance(result, HTTPResponse):
         raise HTTPException(status_code=result.code, detail=result.detail)
+    if isinstance(result, tuple):
+        content = response_json(*result)
+        media_type = "application/json"
+    elif accept and ARROW_STREAM_MEDIA_TYPE in accept:
+        content = results_arrow_stream(result)
+        media_type = ARROW_STREAM_MEDIA_TYPE
     else:
-        return FlexibilizationResponse(result=result)
+        content = response_json(result)
+        media_type = "application/json"
+    content, encoding = compress(
+        content, accept_encoding, Settings.compression_min_size
+    )
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+@router.post("/stream")
+async def flexibilize_stream(
+    req: FlexibilizationRequest,
+    uriParser: AbstractURIParsingRepository = Depends(uriParser),
+    accept: Optional[str] = Header(None),
+):
+    path = uriParser.parse(req.id)
+    if isinstance(path, HTTPResponse):
+        raise HTTPException(status_code=path.code, detail=path.detail)
+    sse = accept is not None and "text/event-stream" in accept
+    progresso = ProgressQueue()
+    cancelamento = request_token(req.timeout)
+
+    async def executa():
+        try:
+            result = await executa_flex(req, path, progresso, cancelamento)
+        except AdmissionRejectedError as e:
+            result = HTTPResponse(code=429, detail=e.detail)
+        except Exception as e:
+            result = HTTPResponse(code=500, detail=str(e))
+        if isinstance(result, HTTPResponse):
+            progresso("error", {"code": result.code, "detail": result.detail})
+        elif isinstance(result, tuple):
+            progresso("done", {"result": result[0], "diff": result[1]})
+        else:
+            progresso("done", {"result": result})
+        progresso.close()
+
+    async def eventos():
+        tarefa = asyncio.create_task(executa())
+        bind_task(tarefa)
+        try:
+            while True:
+                item = await progresso.get()
+                if item is None:
+                    break
+                yield progress_event(*item, sse=sse)
+            await tarefa
+        finally:
+            # Encerrada a resposta (inclusive por desconexão do cliente),
+            # a flexibilização é interrompida no próximo estágio
+            cancelamento.cancel()
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(eventos(), media_type=media_type)
+
+
+@router.post(
+    "/variants",
+    response_model=FlexibilizationVariantsResponse,
+)
+async def flexibilize_variants(
+    req: FlexibilizationVariantsRequest,
+    request: Request,
+    uriParser: AbstractURIParsingRepository = Depends(uriParser),
+    accept_encoding: Optional[str] = Header(None),
+):
+    path = uriParser.parse(req.id)
+    if isinstance(path, HTTPResponse):
+        raise HTTPException(status_code=path.code, detail=path.detail)
+    flex_repo = flex_factory(req.program)
+    # O dadger do caso não é alterado, somente os das variantes
+    uow = uow_factory("FS", path, read_only=True)
+    cancelamento = request_token(req.timeout)
+    monitor = asyncio.create_task(
+        cancelamento.watch(request, Settings.disconnect_poll_interval)
+    )
+    try:
+        async with AdmissionController().slot(
+            req.priority, estimate_cost(path)
+        ):
+            result = await flex_repo.variants(
+                req.variants, uow, cancelamento=cancelamento
+            )
+    except AdmissionRejectedError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    finally:
+        monitor.cancel()
+    if isinstance(result, HTTPResponse):
+        raise HTTPException(status_code=result.code, detail=result.detail)
+    content, encoding = compress(
+        variants_json(result), accept_encoding, Settings.compression_min_size
+    )
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(
+        content=content, media_type="application/json", headers=headers
+    )
+
+
+@router.get(
+    "/patch/{id}",
+    response_model=DadgerPatch,
+)
+async def get_patch(
+    id: str,
+    uriParser: AbstractURIParsingRepository = Depends(uriParser),
+):
+    path = uriParser.parse(id)
+    if isinstance(path, HTTPResponse):
+        raise HTTPException(status_code=path.code, detail=path.detail)
+    uow = uow_factory("FS", path, read_only=True)
+    try:
+        async with uow:
+            patch = uow.files.get_dadger_patch()
+    except LockTimeoutError as e:
+        raise HTTPException(status_code=423, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if isinstance(patch, HTTPResponse):
+        raise HTTPException(status_code=patch.code, detail=patch.detail)
+    return Response(
+        content=dadger_patch_json(patch), media_type="application/json"
+    )
+
+
+@router.post("/patch/{id}")
+async def apply_patch(
+    id: str,
+    patch: DadgerPatch,
+    uriParser: AbstractURIParsingRepository = Depends(uriParser),
+):
+    path = uriParser.parse(id)
+    if isinstance(path, HTTPResponse):
+        raise HTTPException(status_code=path.code, detail=path.detail)
+    uow = uow_factory("FS", path)
+    try:
+        async with uow:
+            result = await uow.files.apply_dadger_patch(patch)
+            if result.code == 200:
+                uow.commit()
+    except LockTimeoutError as e:
+        raise HTTPException(status_code=423, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result.code != 200:
+        raise HTTPException(status_code=result.code, detail=result.detail)
+    return {"detail": "Patch aplicado"}
+
+
+@router.get(
+    "/history/{id}",
+    response_model=FlexibilizationHistoryResponse,
+)
+async def history(
+    id: str,
+    uriParser: AbstractURIParsingRepository = Depends(uriParser),
+):
+    path = uriParser.parse(id)
+    if isinstance(path, HTTPResponse):
+        raise HTTPException(status_code=path.code, detail=path.detail)
+    uow = uow_factory("FS", path)
+    try:
+        rounds = uow.history.rounds()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return FlexibilizationHistoryResponse(rounds=rounds)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from app.utils.metrics import Metrics
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@router.get("/")
+async def metrics() -> dict:
+    return Metrics.summary()
@@ -1,12 +1,20 @@
 from abc import ABC, abstractmethod
-from os import chdir, curdir
 from typing import Dict, Type
-from pathlib import Path
 
 from app.adapters.filesrepository import (
     AbstractFilesRepository,
     RawFilesRepository,
 )
+from app.adapters.historyrepository import (
+    AbstractHistoryRepository,
+    SQLiteHistoryRepository,
+)
+from app.adapters.exportrepository import (
+    AbstractExportRepository,
+    ParquetExportRepository,
+)
+from app.internal.lock import case_lock
+from app.internal.settings import Settings
 
 
 class AbstractUnitOfWork(ABC):
@@ -16,44 +24,125 @@ class AbstractUnitOfWork(ABC):
     def __exit__(self, *args):
         self.rollback()
 
+    async def __aenter__(self) -> "AbstractUnitOfWork":
+        return self.__enter__()
+
+    async def __aexit__(self, *args):
+        self.__exit__(*args)
+
+    @abstractmethod
+    def commit(self):
+        raise NotImplementedError
+
     @abstractmethod
     def rollback(self):
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def directory(self) -> str:
+        raise NotImplementedError
+
     @property
     @abstractmethod
     def files(self) -> AbstractFilesRepository:
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def history(self) -> AbstractHistoryRepository:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def export(self) -> AbstractExportRepository:
+        raise NotImplementedError
+
 
 class FSUnitOfWork(AbstractUnitOfWork):
-    def __init__(self, directory: str):
-        self._current_path = Path(curdir).resolve()
+    def __init__(self, directory: str, read_only: bool = False):
         self._case_directory = directory
+        self._read_only = read_only
         self._files = None
+        self._committed = False
+        self._history = SQLiteHistoryRepository(
+            str(directory), Settings.history_file
+        )
+        self._export = ParquetExportRepository(
+            str(directory), Settings.export_directory
+        )
+        self._lock = case_lock(
+            directory,
+            Settings.lock_file,
+            Settings.lock_timeout,
+            Settings.lock_poll_interval,
+            shared=read_only,
+        )
 
     def __create_repository(self):
         if self._files is None:
-            self._files = RawFilesRepository(str(self._case_directory))
+            self._files = RawFilesRepository(
+                str(self._case_directory), read_only=self._read_only
+            )
 
-    def __enter__(self) -> "FSUnitOfWork":
-        chdir(self._case_directory)
+    def __enter_case(self) -> "FSUnitOfWork":
+        # Todos os caminhos são obtidos a partir do diretório do caso,
+        # sem alterar o diretório de trabalho do processo, que é
+        # compartilhado pelas requisições simultâneas
         self.__create_repository()
         uow = super().__enter__()
         assert isinstance(uow, FSUnitOfWork)
         return uow
 
+    def __enter__(self) -> "FSUnitOfWork":
+        self._lock.acquire()
+        try:
+            return self.__enter_case()
+        except Exception:
+            self._lock.release()
+            raise
+
     def __exit__(self, *args):
-        chdir(self._current_path)
-        super().__exit__(*args)
+        try:
+            super().__exit__(*args)
+        finally:
+            self._lock.release()
+
+    async def __aenter__(self) -> "FSUnitOfWork":
+        await self._lock.acquire_async()
+        try:
+            return self.__enter_case()
+        except Exception:
+            self._lock.release()
+            raise
+
+    async def __aexit__(self, *args):
+        self.__exit__(*args)
+
+    @property
+    def directory(self) -> str:
+        return str(self._case_directory)
 
     @property
     def files(self) -> RawFilesRepository:
         assert isinstance(self._files, RawFilesRepository)
         return self._files
 
+    @property
+    def history(self) -> SQLiteHistoryRepository:
+        return self._history
+
+    @property
+    def export(self) -> ParquetExportRepository:
+        return self._export
+
+    def commit(self):
+        self._committed = True
+
     def rollback(self):
-        pass
+        if self._committed or self._files is None:
+            return
+        self._files.rollback_dadger()
 
 
 def factory(kind: str, *args, **kwargs) -> AbstractUnitOfWork:
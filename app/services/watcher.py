@@ -0,0 +1,201 @@
+import asyncio
+import os
+import time
+from os.path import basename, dirname
+from typing import Dict, List, Optional
+
+from app.adapters.flexibilizationrepository import factory as flex_factory
+from app.adapters.planrepository import PreparedPlan
+from app.adapters.planrepository import factory as plan_factory
+from app.internal.admission import (
+    AdmissionController,
+    AdmissionRejectedError,
+    estimate_cost,
+)
+from app.internal.cancellation import CancellationToken
+from app.internal.settings import Settings
+from app.services.unitofwork import factory as uow_factory
+from app.utils.log import Log
+from app.utils.metrics import Metrics
+
+try:
+    from watchfiles import Change, awatch  # type: ignore
+except ImportError:  # pragma: no cover - dependência opcional
+    awatch = None  # type: ignore[assignment]
+
+PREFIXO_INVIABUNIC = "inviab_unic."
+
+
+def _eh_inviabunic(caminho: str) -> bool:
+    return basename(caminho).lower().startswith(PREFIXO_INVIABUNIC)
+
+
+class CaseWatcher:
+    """
+    Watches the case roots for new `inviab_unic.*` files, written by
+    DECOMP at the end of a run, and prepares the cases ahead of the
+    flexibilization requests: the flexibilization plan is computed or,
+    without precomputing, the parsed tables are read into the on-disk
+    cache. Preparations run on the event loop of the service, through
+    the admission control with the lowest priority. Uses inotify
+    (through `watchfiles`) when available, polling the roots otherwise.
+    """
+
+    def __init__(
+        self,
+        roots: List[str],
+        debounce: float,
+        poll_interval: float,
+        polling: bool = False,
+        precompute: bool = True,
+    ):
+        self.roots = [r for r in roots if os.path.isdir(r)]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.polling = polling or awatch is None
+        self.precompute = precompute
+        self.__pendentes: Dict[str, float] = {}
+        self.__parada = asyncio.Event()
+        self.__cancelamento = CancellationToken()
+        self.__tarefas: List[asyncio.Task] = []
+
+    def __registra(self, caminho: str):
+        if _eh_inviabunic(caminho):
+            self.__pendentes[dirname(caminho)] = time.monotonic()
+
+    async def __observa_inotify(self):
+        async for mudancas in awatch(
+            *self.roots,
+            stop_event=self.__parada,
+            watch_filter=lambda c, p: c != Change.deleted
+            and _eh_inviabunic(p),
+        ):
+            for _, caminho in mudancas:
+                self.__registra(caminho)
+
+    def __varre(self) -> Dict[str, int]:
+        arquivos: Dict[str, int] = {}
+        for root in self.roots:
+            for diretorio, _, nomes in os.walk(root):
+                for nome in nomes:
+                    if _eh_inviabunic(nome):
+                        caminho = os.path.join(diretorio, nome)
+                        try:
+                            arquivos[caminho] = os.stat(caminho).st_mtime_ns
+                        except FileNotFoundError:
+                            pass
+        return arquivos
+
+    async def __observa_polling(self):
+        anteriores = await asyncio.to_thread(self.__varre)
+        while not self.__parada.is_set():
+            try:
+                await asyncio.wait_for(
+                    self.__parada.wait(), timeout=self.poll_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            atuais = await asyncio.to_thread(self.__varre)
+            for caminho, mtime in atuais.items():
+                if anteriores.get(caminho) != mtime:
+                    self.__registra(caminho)
+            anteriores = atuais
+
+    async def __processa_pendentes(self):
+        while not self.__parada.is_set():
+            try:
+                await asyncio.wait_for(
+                    self.__parada.wait(), timeout=self.debounce / 2
+                )
+            except asyncio.TimeoutError:
+                pass
+            agora = time.monotonic()
+            prontos = [
+                d
+                for d, instante in self.__pendentes.items()
+                if agora - instante >= self.debounce
+            ]
+            for diretorio in prontos:
+                self.__pendentes.pop(diretorio, None)
+                await self.__prepara_admitido(diretorio)
+
+    async def __prepara_admitido(self, diretorio: str):
+        # As preparações disputam os mesmos recursos das requisições,
+        # com a menor das prioridades
+        controle = AdmissionController()
+        prioridade = controle.classes[-1] if controle.classes else None
+        try:
+            async with controle.slot(prioridade, estimate_cost(diretorio)):
+                await self.prepara(diretorio)
+        except AdmissionRejectedError as e:
+            Log.log().info(
+                f"Preparação do caso {diretorio} adiada: {e.detail}"
+            )
+            self.__pendentes.setdefault(diretorio, time.monotonic())
+
+    async def prepara(self, diretorio: str):
+        inicio = time.monotonic()
+        Log.log().info(f"Preparando o caso {diretorio}")
+        try:
+            if self.precompute:
+                plano = await flex_factory("DECOMP").prepare(
+                    uow_factory("FS", diretorio), self.__cancelamento
+                )
+                if not isinstance(plano, PreparedPlan):
+                    raise RuntimeError(plano.detail)
+                plan_factory("MEMORY", Settings.watch_max_plans).put(
+                    diretorio, plano
+                )
+            else:
+                # Somente as tabelas mantidas no cache em disco são lidas
+                uow = uow_factory("FS", diretorio, read_only=True)
+                async with uow:
+                    await asyncio.to_thread(
+                        uow.files.get_inviabilidades_simulacao_final
+                    )
+                    await asyncio.to_thread(uow.files.get_relato)
+            Metrics.increment("watcher_prepared_total")
+            Log.log().info(f"Caso {diretorio} preparado")
+        except Exception as e:
+            Metrics.increment("watcher_errors_total")
+            Log.log().warning(f"Erro na preparação do caso {diretorio}: {e}")
+        Metrics.observe("watcher_prepare_seconds", time.monotonic() - inicio)
+
+    def start(self):
+        if len(self.roots) == 0:
+            return
+        if not self.precompute and not Settings.cache_directory:
+            Log.log().warning(
+                "Observação dos casos desabilitada: sem WATCH_PRECOMPUTE"
+                + " nem CACHE_DIRECTORY, não há o que preparar"
+            )
+            return
+        modo = "polling" if self.polling else "inotify"
+        Log.log().info(f"Observando {self.roots} ({modo})")
+        observador = (
+            self.__observa_polling()
+            if self.polling
+            else self.__observa_inotify()
+        )
+        self.__tarefas = [
+            asyncio.create_task(observador),
+            asyncio.create_task(self.__processa_pendentes()),
+        ]
+
+    async def stop(self):
+        self.__parada.set()
+        self.__cancelamento.cancel()
+        await asyncio.gather(*self.__tarefas, return_exceptions=True)
+        self.__tarefas = []
+
+
+def factory() -> Optional[CaseWatcher]:
+    if not Settings.watch_roots:
+        return None
+    return CaseWatcher(
+        Settings.watch_roots.split(os.pathsep),
+        Settings.watch_debounce,
+        Settings.watch_poll_interval,
+        polling=Settings.watch_polling,
+        precompute=Settings.watch_precompute,
+    )
@@ -0,0 +1,369 @@
+from copy import copy, deepcopy
+from difflib import SequenceMatcher
+from io import StringIO
+from typing import Dict, List, Optional, Tuple
+import mmap
+import os
+import numpy as np
+from idecomp.decomp.dadger import Dadger
+
+from app.models.dadgerdiff import DadgerDiffRecord
+from app.models.dadgerpatch import DadgerPatchChange
+
+# Registros do dadger consultados ou alterados nas flexibilizações
+REGISTROS_FLEXIBILIZACAO = (
+    "UH",
+    "TI",
+    "HV",
+    "LV",
+    "CV",
+    "HQ",
+    "LQ",
+    "RE",
+    "LU",
+    "HE",
+    "CM",
+    "FP",
+    "FC",
+    "AC",
+)
+CODIFICACOES = ["utf-8", "latin-1"]
+
+
+class DadgerPatcher:
+    """
+    Patch mode for the dadger: indexes the byte offsets of the lines of
+    the file once, through a memory map, and parses only the records of
+    the given types. On writing, only the changed or inserted records
+    are rendered, while the untouched bytes are streamed unchanged.
+    """
+
+    def __init__(
+        self,
+        caminho: str,
+        registros: Tuple[str, ...] = REGISTROS_FLEXIBILIZACAO,
+    ):
+        self.caminho = caminho
+        self.__registros = tuple(r.encode("ascii") for r in registros)
+        self.__inicios = np.zeros(0, dtype=np.int64)
+        self.__selecionadas = np.zeros(0, dtype=np.int64)
+        self.__tamanho = 0
+        self.__mtime = 0
+        self.__codificacao = CODIFICACOES[0]
+        # Para cada registro lido: (índice da linha, dados originais)
+        self.__origens: Dict[int, Tuple[int, list]] = {}
+        self.__dadger: Optional[Dadger] = None
+
+    def __indexa(self, mm: mmap.mmap):
+        conteudo = np.frombuffer(mm, dtype=np.uint8)
+        fins = np.flatnonzero(conteudo == ord("\n")) + 1
+        if len(fins) == 0 or fins[-1] != len(conteudo):
+            fins = np.append(fins, len(conteudo))
+        self.__inicios = np.concatenate(([0], fins)).astype(np.int64)
+        # Filtra as linhas pelo identificador (duas primeiras colunas)
+        inicios = self.__inicios[:-1]
+        validas = (self.__inicios[1:] - inicios) >= 2
+        ids = np.zeros(len(inicios), dtype=np.uint16)
+        ids[validas] = (
+            conteudo[inicios[validas]].astype(np.uint16) << 8
+        ) | conteudo[inicios[validas] + 1]
+        alvos = [(r[0] << 8) | r[1] for r in self.__registros]
+        self.__selecionadas = np.flatnonzero(
+            validas & np.isin(ids, alvos)
+        ).astype(np.int64)
+        del conteudo
+
+    def __linha(self, mm: mmap.mmap, i: int) -> bytes:
+        return mm[int(self.__inicios[i]) : int(self.__inicios[i + 1])]
+
+    def __decodifica(self, linhas: List[bytes]) -> str:
+        conteudo = b"".join(linhas)
+        for codificacao in CODIFICACOES:
+            try:
+                texto = conteudo.decode(codificacao)
+                self.__codificacao = codificacao
+                return texto
+            except UnicodeDecodeError:
+                pass
+        raise UnicodeDecodeError(
+            "latin-1", conteudo, 0, len(conteudo), "codificação inválida"
+        )
+
+    def le(self) -> Dadger:
+        """
+        Parses only the selected records into a (partial) Dadger object,
+        which supports the same queries and insertions as the full one.
+        """
+        estado = os.stat(self.caminho)
+        self.__tamanho = estado.st_size
+        self.__mtime = estado.st_mtime_ns
+        with open(self.caminho, "rb") as arq:
+            with mmap.mmap(arq.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.__indexa(mm)
+                linhas = [
+                    self.__linha(mm, int(i)) for i in self.__selecionadas
+                ]
+        texto = self.__decodifica(linhas)
+        dadger = Dadger.read(texto)
+        registros = [r for r in dadger.data][1:]
+        if len(registros) != len(self.__selecionadas):
+            raise ValueError(
+                f"Leitura parcial do dadger inconsistente: {len(registros)}"
+                + f" registros para {len(self.__selecionadas)} linhas"
+            )
+        self.__origens = {
+            id(r): (int(i), list(r.data))
+            for r, i in zip(registros, self.__selecionadas)
+        }
+        self.__dadger = dadger
+        return dadger
+
+    def reindexa(self):
+        """
+        Indexes the file again after the Dadger object was written to
+        it, so that the same object can be changed and written in later
+        rounds without parsing the file.
+        """
+        if self.__dadger is None:
+            raise ValueError("O dadger não foi lido em modo patch")
+        estado = os.stat(self.caminho)
+        with open(self.caminho, "rb") as arq:
+            with mmap.mmap(arq.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                self.__indexa(mm)
+        registros = [r for r in self.__dadger.data][1:]
+        if len(registros) != len(self.__selecionadas):
+            raise ValueError(
+                f"Reindexação do dadger inconsistente: {len(registros)}"
+                + f" registros para {len(self.__selecionadas)} linhas"
+            )
+        self.__tamanho = estado.st_size
+        self.__mtime = estado.st_mtime_ns
+        self.__origens = {
+            id(r): (int(i), list(r.data))
+            for r, i in zip(registros, self.__selecionadas)
+        }
+
+    @property
+    def dadger(self) -> Optional[Dadger]:
+        return self.__dadger
+
+    @property
+    def codificacao(self) -> str:
+        return self.__codificacao
+
+    def copia(self) -> "DadgerPatcher":
+        """
+        Returns an independent patcher over a deep copy of the (partial)
+        Dadger object, sharing the line index of this one, so that
+        several variants of the same file can be changed and written
+        without parsing it again.
+        """
+        if self.__dadger is None:
+            raise ValueError("O dadger não foi lido em modo patch")
+        patcher = copy(self)
+        dadger = deepcopy(self.__dadger)
+        patcher.__dadger = dadger
+        patcher.__origens = {
+            id(c): self.__origens[id(r)]
+            for r, c in zip(self.__dadger.data, dadger.data)
+            if id(r) in self.__origens
+        }
+        return patcher
+
+    def __renderiza(self, registro) -> bytes:
+        buffer = StringIO()
+        registro.write(buffer)
+        return buffer.getvalue().encode(self.__codificacao)
+
+    def alteracoes(
+        self,
+    ) -> Tuple[Dict[int, bytes], Dict[int, List[bytes]]]:
+        """
+        Returns the line substitutions (line index -> new content, empty
+        for removed lines) and insertions (line index -> lines to be
+        written before it) made on the Dadger object since it was read.
+        """
+        if self.__dadger is None:
+            raise ValueError("O dadger não foi lido em modo patch")
+        num_linhas = len(self.__inicios) - 1
+        substituicoes: Dict[int, bytes] = {}
+        insercoes: Dict[int, List[bytes]] = {}
+        vistos = set()
+        proxima = (
+            int(self.__selecionadas[0])
+            if len(self.__selecionadas) > 0
+            else num_linhas
+        )
+        for r in [r for r in self.__dadger.data][1:]:
+            origem = self.__origens.get(id(r))
+            if origem is None:
+                insercoes.setdefault(proxima, []).append(self.__renderiza(r))
+                continue
+            linha, dados = origem
+            vistos.add(id(r))
+            proxima = linha + 1
+            if r.data != dados:
+                substituicoes[linha] = self.__renderiza(r)
+        for chave, (linha, _) in self.__origens.items():
+            if chave not in vistos:
+                substituicoes[linha] = b""
+        return substituicoes, insercoes
+
+    def __texto(self, linha: bytes) -> str:
+        return linha.decode(self.__codificacao).rstrip()
+
+    def diferencas(self) -> List[DadgerDiffRecord]:
+        """
+        Returns the record-level diff between the original file and the
+        Dadger object, without writing anything. Lines are 1-based and
+        refer to the original file (for insertions, the line before
+        which the record would be written).
+        """
+        substituicoes, insercoes = self.alteracoes()
+        diff: List[DadgerDiffRecord] = []
+        with open(self.caminho, "rb") as arq:
+            with mmap.mmap(arq.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for i in sorted(set(substituicoes) | set(insercoes)):
+                    for linha in insercoes.get(i, []):
+                        texto = self.__texto(linha)
+                        diff.append(
+                            DadgerDiffRecord(i + 1, texto[:2], None, texto)
+                        )
+                    if i in substituicoes:
+                        antes = self.__texto(self.__linha(mm, i))
+                        depois = (
+                            self.__texto(substituicoes[i])
+                            if substituicoes[i]
+                            else None
+                        )
+                        diff.append(
+                            DadgerDiffRecord(i + 1, antes[:2], antes, depois)
+                        )
+        return diff
+
+    def mudancas(self) -> List[DadgerPatchChange]:
+        """
+        Returns the changes made on the Dadger object since it was read,
+        as the (1-based) line operations of a dadger patch.
+        """
+        substituicoes, insercoes = self.alteracoes()
+        mudancas: List[DadgerPatchChange] = []
+        for i in sorted(set(substituicoes) | set(insercoes)):
+            for linha in insercoes.get(i, []):
+                mudancas.append(
+                    DadgerPatchChange(
+                        line=i + 1,
+                        op="insert",
+                        content=linha.decode(self.__codificacao),
+                    )
+                )
+            if i in substituicoes:
+                if substituicoes[i]:
+                    mudancas.append(
+                        DadgerPatchChange(
+                            line=i + 1,
+                            op="replace",
+                            content=substituicoes[i].decode(
+                                self.__codificacao
+                            ),
+                        )
+                    )
+                else:
+                    mudancas.append(DadgerPatchChange(line=i + 1, op="delete"))
+        return mudancas
+
+    def escreve(self, destino: str):
+        """
+        Writes the patched dadger to `destino`, copying the unchanged
+        byte ranges of the original file.
+        """
+        estado = os.stat(self.caminho)
+        if (
+            estado.st_size != self.__tamanho
+            or estado.st_mtime_ns != self.__mtime
+        ):
+            raise ValueError(f"O arquivo {self.caminho} foi alterado")
+        substituicoes, insercoes = self.alteracoes()
+        num_linhas = len(self.__inicios) - 1
+        with open(self.caminho, "rb") as arq, open(destino, "wb") as saida:
+            with mmap.mmap(arq.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                posicao = 0
+                for i in sorted(set(substituicoes) | set(insercoes)):
+                    inicio = int(self.__inicios[min(i, num_linhas)])
+                    saida.write(mm[posicao:inicio])
+                    for linha in insercoes.get(i, []):
+                        saida.write(linha)
+                    posicao = inicio
+                    if i in substituicoes:
+                        saida.write(substituicoes[i])
+                        posicao = int(self.__inicios[i + 1])
+                saida.write(mm[posicao:])
+
+
+def aplica_mudancas(
+    caminho: str,
+    destino: str,
+    mudancas: List[DadgerPatchChange],
+    codificacao: str,
+):
+    """
+    Writes to `destino` the file `caminho` with the line operations of
+    a dadger patch applied.
+    """
+    substituicoes: Dict[int, bytes] = {}
+    insercoes: Dict[int, List[bytes]] = {}
+    for m in mudancas:
+        conteudo = (m.content or "").encode(codificacao)
+        if m.op == "insert":
+            insercoes.setdefault(m.line - 1, []).append(conteudo)
+        elif m.op == "replace":
+            substituicoes[m.line - 1] = conteudo
+        elif m.op == "delete":
+            substituicoes[m.line - 1] = b""
+        else:
+            raise ValueError(f"Operação inválida no patch: {m.op}")
+    with open(caminho, "rb") as arq:
+        linhas = arq.read().splitlines(keepends=True)
+    if any(i >= len(linhas) for i in substituicoes) or any(
+        i > len(linhas) for i in insercoes
+    ):
+        raise ValueError("Linha do patch fora do arquivo")
+    with open(destino, "wb") as saida:
+        for i, linha in enumerate(linhas):
+            for inserida in insercoes.get(i, []):
+                saida.write(inserida)
+            saida.write(substituicoes.get(i, linha))
+        for inserida in insercoes.get(len(linhas), []):
+            saida.write(inserida)
+
+
+def _renderiza(registro) -> str:
+    buffer = StringIO()
+    registro.write(buffer)
+    return buffer.getvalue().rstrip()
+
+
+def diferencas_dadger(
+    original: Dadger, alterado: Dadger
+) -> List[DadgerDiffRecord]:
+    """
+    Returns the record-level diff between a complete Dadger object read
+    from the file and a changed one, by comparing their rendered
+    records. Used when the dadger was not read in patch mode. Lines are
+    1-based and refer to the records of the original object.
+    """
+    antes = [_renderiza(r) for r in original.data][1:]
+    depois = [_renderiza(r) for r in alterado.data][1:]
+    diff: List[DadgerDiffRecord] = []
+    opcodes = SequenceMatcher(None, antes, depois).get_opcodes()
+    for op, i1, i2, j1, j2 in opcodes:
+        if op == "equal":
+            continue
+        pares = max(i2 - i1, j2 - j1)
+        for k in range(pares):
+            a = antes[i1 + k] if i1 + k < i2 else None
+            b = depois[j1 + k] if j1 + k < j2 else None
+            linha = i1 + k + 1 if a is not None else i2 + 1
+            registro = (a or b or "")[:2]
+            diff.append(DadgerDiffRecord(linha, registro, a, b))
+    return diff
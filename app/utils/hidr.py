@@ -0,0 +1,64 @@
+import os
+import numpy as np
+
+# Tamanhos de registro do hidr.dat: coeficientes em 32 ou 64 bits
+TAMANHOS_REGISTRO = [792, 832]
+NUMEROS_REGISTROS = [320, 600]
+# Deslocamento (bytes) do campo de vazão mínima histórica no registro
+OFFSETS_VAZAO_MINIMA = {792: 708, 832: 748}
+TAMANHO_NOME = 12
+
+
+class HidrMemmap:
+    """
+    Read-only view of the hidr.dat registry through a NumPy memmap with
+    a structured dtype, exposing only the fields used by the service.
+    Plant codes are the 1-based positions of the records in the file.
+    """
+
+    def __init__(self, caminho: str):
+        tamanho = self.__tamanho_registro(os.path.getsize(caminho))
+        dtype = np.dtype(
+            {
+                "names": ["nome_usina", "vazao_minima_historica"],
+                "formats": [f"S{TAMANHO_NOME}", "<i4"],
+                "offsets": [0, OFFSETS_VAZAO_MINIMA[tamanho]],
+                "itemsize": tamanho,
+            }
+        )
+        self.__registros = np.memmap(caminho, dtype=dtype, mode="r")
+        # Índice vetorizado dos nomes: ordenados, com a ordem original
+        nomes = np.char.strip(self.__registros["nome_usina"])
+        self.__ordem = np.argsort(nomes, kind="stable")
+        self.__nomes_ordenados = nomes[self.__ordem]
+
+    @staticmethod
+    def __tamanho_registro(num_bytes: int) -> int:
+        for tamanho in TAMANHOS_REGISTRO:
+            if num_bytes % tamanho == 0:
+                if num_bytes // tamanho in NUMEROS_REGISTROS:
+                    return tamanho
+        return TAMANHOS_REGISTRO[0]
+
+    def codigos_usinas(self, nomes: list) -> np.ndarray:
+        """
+        Resolves the codes of the given plant names at once. Names that
+        are not in the registry are mapped to -1.
+        """
+        chaves = np.array(
+            [n.strip().encode("latin-1") for n in nomes],
+            dtype=self.__nomes_ordenados.dtype,
+        )
+        posicoes = np.searchsorted(self.__nomes_ordenados, chaves)
+        posicoes = np.minimum(posicoes, len(self.__nomes_ordenados) - 1)
+        encontrados = self.__nomes_ordenados[posicoes] == chaves
+        return np.where(encontrados, self.__ordem[posicoes] + 1, -1)
+
+    def codigo_usina(self, nome: str) -> int:
+        codigo = int(self.codigos_usinas([nome])[0])
+        if codigo < 0:
+            raise KeyError(f"Usina {nome} não encontrada no hidr")
+        return codigo
+
+    def vazao_minima_historica(self, codigo: int) -> int:
+        return int(self.__registros["vazao_minima_historica"][codigo - 1])
@@ -0,0 +1,62 @@
+from typing import Dict, Tuple
+import pandas as pd  # type: ignore
+
+INICIO_SIMULACAO_FINAL = b"SIMULACAO FINAL:"
+# Linhas de cabeçalho após a linha com INICIO_SIMULACAO_FINAL
+LINHAS_CABECALHO = 3
+ENCODINGS = ["utf-8", "latin-1"]
+
+
+def _decodifica(linha: bytes) -> str:
+    for encoding in ENCODINGS:
+        try:
+            return linha.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return linha.decode("ascii", errors="replace")
+
+
+def le_inviabilidades_simulacao_final(caminho: str) -> pd.DataFrame:
+    """
+    Reads the final simulation block of an inviab_unic file line by
+    line, skipping the iterations block, and keeps only the maximum
+    violation of each (estagio, restricao, unidade), so memory is
+    bounded by the number of distinct constraints.
+
+    :param caminho: Path to the inviab_unic file
+    :return: Table with the same columns of
+        `InviabUnic.inviabilidades_simulacao_final`
+    :rtype: pd.DataFrame
+    """
+    maximos: Dict[Tuple[int, str, str], Tuple[int, float]] = {}
+    with open(caminho, "rb") as arq:
+        for linha in arq:
+            if INICIO_SIMULACAO_FINAL in linha:
+                break
+        else:
+            raise ValueError("Bloco SIMULACAO FINAL não encontrado")
+        for _ in range(LINHAS_CABECALHO):
+            arq.readline()
+        for linha_bin in arq:
+            texto = _decodifica(linha_bin)
+            if len(texto.strip()) < 5:
+                break
+            estagio = int(texto[4:12])
+            cenario = int(texto[13:21])
+            restricao = texto[22:98].strip()
+            violacao = float(texto[99:115])
+            unidade = texto[116:121].strip()
+            chave = (estagio, restricao, unidade)
+            atual = maximos.get(chave)
+            if atual is None or violacao > atual[1]:
+                maximos[chave] = (cenario, violacao)
+    return pd.DataFrame(
+        data={
+            "estagio": [c[0] for c in maximos.keys()],
+            "cenario": [v[0] for v in maximos.values()],
+            "restricao": [c[1] for c in maximos.keys()],
+            "violacao": [v[1] for v in maximos.values()],
+            "unidade": [c[2] for c in maximos.keys()],
+        },
+        columns=["estagio", "cenario", "restricao", "violacao", "unidade"],
+    )
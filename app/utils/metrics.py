@@ -0,0 +1,81 @@
+from threading import Lock
+from typing import Dict, List
+
+from app.utils.singleton import Singleton
+
+
+class Metrics(metaclass=Singleton):
+    """
+    In-process registry of counters, gauges and histograms, shared by
+    every component of the service and exported through `/metrics`.
+    """
+
+    BUCKETS: List[float] = [
+        0.005,
+        0.01,
+        0.05,
+        0.1,
+        0.5,
+        1.0,
+        5.0,
+        10.0,
+        30.0,
+        60.0,
+        float("inf"),
+    ]
+
+    __lock = Lock()
+    __counters: Dict[str, float] = {}
+    __gauges: Dict[str, float] = {}
+    __histograms: Dict[str, dict] = {}
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1.0):
+        with cls.__lock:
+            cls.__counters[name] = cls.__counters.get(name, 0.0) + value
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float):
+        with cls.__lock:
+            cls.__gauges[name] = value
+
+    @classmethod
+    def observe(cls, name: str, value: float):
+        with cls.__lock:
+            h = cls.__histograms.get(name)
+            if h is None:
+                h = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "max": 0.0,
+                    "buckets": [0] * len(cls.BUCKETS),
+                }
+                cls.__histograms[name] = h
+            h["count"] += 1
+            h["sum"] += value
+            h["max"] = max(h["max"], value)
+            for i, limite in enumerate(cls.BUCKETS):
+                if value <= limite:
+                    h["buckets"][i] += 1
+                    break
+
+    @classmethod
+    def summary(cls) -> dict:
+        with cls.__lock:
+            histograms = {
+                name: {
+                    "count": h["count"],
+                    "sum": h["sum"],
+                    "max": h["max"],
+                    "buckets": {
+                        str(limite): n
+                        for limite, n in zip(cls.BUCKETS, h["buckets"])
+                    },
+                }
+                for name, h in cls.__histograms.items()
+            }
+            return {
+                "counters": dict(cls.__counters),
+                "gauges": dict(cls.__gauges),
+                "histograms": histograms,
+            }
@@ -0,0 +1,212 @@
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import glob
+import json
+import os
+import pathlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple, Union
+
+from app.adapters.flexibilizationrepository import (
+    AbstractFlexibilizationRepository,
+)
+from app.adapters.flexibilizationrepository import factory as flex_factory
+from app.internal.httpresponse import HTTPResponse
+from app.internal.serialization import error_json, response_json
+from app.internal.settings import Settings
+from app.models.dadgerdiff import DadgerDiffRecord
+from app.models.flexibilizationresult import FlexibilizationRecord
+from app.models.flexibilizationrule import FlexibilizationRule
+from app.services.unitofwork import factory as uow_factory
+from app.utils.log import Log
+
+BASEDIR = pathlib.Path().resolve()
+INSTALLDIR = os.path.dirname(os.path.abspath(__file__))
+os.environ["APP_INSTALLDIR"] = INSTALLDIR
+load_dotenv(
+    pathlib.Path(INSTALLDIR).joinpath(".env"),
+    override=True,
+)
+
+# Estado de cada processo do pool, mantido entre os casos processados
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_repo: Optional[AbstractFlexibilizationRepository] = None
+
+
+def expande_casos(padroes: List[str]) -> List[str]:
+    """
+    Expands the given directories and glob patterns into the (unique,
+    absolute) case directories, keeping the given order.
+    """
+    casos: List[str] = []
+    for padrao in padroes:
+        encontrados = (
+            sorted(glob.glob(padrao)) if glob.has_magic(padrao) else [padrao]
+        )
+        for caminho in encontrados:
+            caminho = os.path.abspath(caminho)
+            if os.path.isdir(caminho) and caminho not in casos:
+                casos.append(caminho)
+    return casos
+
+
+def _inicializa(programa: str, cache: str):
+    # Executado uma vez por processo: as configurações, o logger, o
+    # event loop e o repositório são reaproveitados entre os casos
+    global _loop, _repo
+    Settings.read_environments()
+    Settings.cache_directory = cache
+    if Log.LOGGER is None:
+        Log.configure_logging(str(BASEDIR))
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _repo = flex_factory(programa)
+
+
+def _processa(
+    caso: str, regras: List[dict], dry_run: bool, destino: str
+) -> dict:
+    assert _loop is not None and _repo is not None
+    inicio = time.monotonic()
+    rules = [FlexibilizationRule(**r) for r in regras]
+    uow = uow_factory("FS", caso, read_only=dry_run)
+    result: Union[
+        Tuple[List[FlexibilizationRecord], List[DadgerDiffRecord]],
+        List[FlexibilizationRecord],
+        HTTPResponse,
+    ]
+    try:
+        if dry_run:
+            result = _loop.run_until_complete(_repo.dry_run(rules, uow))
+        else:
+            result = _loop.run_until_complete(_repo.flex(rules, uow))
+    except Exception as e:
+        result = HTTPResponse(code=500, detail=str(e))
+    if isinstance(result, HTTPResponse):
+        conteudo = error_json(result.code, result.detail)
+        codigo, detalhe, num = result.code, result.detail, 0
+    elif isinstance(result, tuple):
+        conteudo = response_json(*result)
+        codigo, detalhe, num = 200, None, len(result[0])
+    else:
+        conteudo = response_json(result)
+        codigo, detalhe, num = 200, None, len(result)
+    with open(destino, "wb") as arq:
+        arq.write(conteudo)
+    return {
+        "case": caso,
+        "code": codigo,
+        "detail": detalhe,
+        "flexibilizations": num,
+        "output": destino,
+        "duration": time.monotonic() - inicio,
+    }
+
+
+def executa(args: argparse.Namespace) -> dict:
+    casos = expande_casos(args.cases)
+    regras = []
+    if args.rules:
+        with open(args.rules, "r") as arq:
+            regras = json.load(arq)
+    os.makedirs(args.output, exist_ok=True)
+    # As tabelas lidas são compartilhadas entre os processos por meio do
+    # cache em disco, que por padrão fica no diretório dos resultados
+    cache = ""
+    if not args.no_cache:
+        cache = os.path.abspath(
+            args.cache
+            or Settings.cache_directory
+            or os.path.join(args.output, "cache")
+        )
+    Log.log().info(f"Flexibilizando {len(casos)} casos")
+    inicio = time.monotonic()
+    resultados = []
+    with ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_inicializa,
+        initargs=(args.program, cache),
+    ) as executor:
+        tarefas = {
+            executor.submit(
+                _processa,
+                caso,
+                regras,
+                args.dry_run,
+                os.path.join(
+                    os.path.abspath(args.output),
+                    f"{i:04d}_{os.path.basename(caso)}.json",
+                ),
+            ): caso
+            for i, caso in enumerate(casos)
+        }
+        for tarefa in as_completed(tarefas):
+            try:
+                r = tarefa.result()
+            except Exception as e:
+                r = {"case": tarefas[tarefa], "code": 500, "detail": str(e)}
+            Log.log().info(f"Caso {r['case']}: {r['code']}")
+            resultados.append(r)
+    resultados.sort(key=lambda r: casos.index(r["case"]))
+    falhas = [r for r in resultados if r["code"] != 200]
+    return {
+        "cases": len(casos),
+        "succeeded": len(casos) - len(falhas),
+        "failed": len(falhas),
+        "dry_run": args.dry_run,
+        "duration": time.monotonic() - inicio,
+        "results": resultados,
+    }
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Flexibilização em lote, sem o serviço HTTP"
+    )
+    parser.add_argument(
+        "cases", nargs="+", help="diretórios dos casos ou padrões glob"
+    )
+    parser.add_argument("--program", default="DECOMP")
+    parser.add_argument("--rules", help="arquivo JSON com as regras")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="processos"
+    )
+    parser.add_argument(
+        "--output",
+        default="flexibilizador_lote",
+        help="diretório para os resultados de cada caso",
+    )
+    parser.add_argument(
+        "--summary", default="resumo.json", help="arquivo do resumo"
+    )
+    parser.add_argument(
+        "--cache",
+        help="diretório do cache em disco (por padrão, CACHE_DIRECTORY"
+        + " ou o subdiretório cache de --output)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="desabilita o cache"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    Settings.read_environments()
+    Log.configure_logging(str(BASEDIR))
+    resumo = executa(args)
+    with open(os.path.join(args.output, args.summary), "w") as arq:
+        json.dump(resumo, arq, indent=2)
+    Log.log().info(
+        f"{resumo['succeeded']} casos flexibilizados, {resumo['failed']}"
+        + f" falhas em {resumo['duration']:.1f} s"
+    )
+    return 0 if resumo["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
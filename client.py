@@ -0,0 +1,263 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Union
+
+import aiohttp
+import base62  # type: ignore
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.models.flexibilizationhistory import FlexibilizationHistoryResponse
+from app.models.flexibilizationresponse import FlexibilizationResponse
+from app.models.flexibilizationrule import FlexibilizationRule
+
+Regra = Union[FlexibilizationRule, dict]
+Resultado = Union[FlexibilizationResponse, "FlexibilizationError"]
+
+
+class FlexibilizationError(Exception):
+    def __init__(self, case: str, code: int, detail: str):
+        super().__init__(f"{case}: [{code}] {detail}")
+        self.case = case
+        self.code = code
+        self.detail = detail
+
+
+def encode_case(case: str) -> str:
+    """
+    Encodes the case directory as the `id` expected by the service
+    (the absolute path, in base62).
+    """
+    return base62.encodebytes(os.path.abspath(case).encode("utf-8"))
+
+
+def _regra(regra: Regra) -> dict:
+    if isinstance(regra, dict):
+        return regra
+    if hasattr(regra, "model_dump"):
+        return regra.model_dump(exclude_none=True)
+    return regra.dict(exclude_none=True)
+
+
+def _corpo(
+    case: str,
+    rules: Optional[Iterable[Regra]],
+    program: str,
+    dry_run: bool,
+    timeout: Optional[float],
+    priority: Optional[str],
+) -> dict:
+    corpo = {
+        "id": encode_case(case),
+        "program": program,
+        "rules": [_regra(r) for r in rules or []],
+        "dryRun": dry_run,
+    }
+    if timeout is not None:
+        corpo["timeout"] = timeout
+    if priority is not None:
+        corpo["priority"] = priority
+    return corpo
+
+
+def _erro(case: str, status: int, conteudo: Union[dict, str]) -> Exception:
+    detalhe = conteudo
+    if isinstance(conteudo, dict):
+        detalhe = conteudo.get("detail", conteudo)
+    return FlexibilizationError(case, status, str(detalhe))
+
+
+class FlexClient:
+    """
+    Synchronous client for the flexibilizador-service, which keeps a
+    pool of keep-alive connections to the service.
+    """
+
+    def __init__(
+        self,
+        url: str = "http://localhost:5052",
+        program: str = "DECOMP",
+        pool_size: int = 8,
+        timeout: Optional[float] = 300.0,
+    ):
+        self.url = url.rstrip("/")
+        self.program = program
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.__session = requests.Session()
+        adaptador = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, pool_block=True
+        )
+        self.__session.mount("http://", adaptador)
+        self.__session.mount("https://", adaptador)
+
+    def __enter__(self) -> "FlexClient":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.__session.close()
+
+    def __resposta(self, case: str, resposta: requests.Response) -> dict:
+        if resposta.status_code >= 400:
+            try:
+                conteudo = resposta.json()
+            except ValueError:
+                conteudo = resposta.text
+            raise _erro(case, resposta.status_code, conteudo)
+        return resposta.json()
+
+    def flex(
+        self,
+        case: str,
+        rules: Optional[Iterable[Regra]] = None,
+        dry_run: bool = False,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+    ) -> FlexibilizationResponse:
+        corpo = _corpo(case, rules, self.program, dry_run, timeout, priority)
+        resposta = self.__session.post(
+            f"{self.url}/flex/", json=corpo, timeout=self.timeout
+        )
+        return FlexibilizationResponse(**self.__resposta(case, resposta))
+
+    def dry_run(
+        self, case: str, rules: Optional[Iterable[Regra]] = None, **kwargs
+    ) -> FlexibilizationResponse:
+        return self.flex(case, rules, dry_run=True, **kwargs)
+
+    def history(self, case: str) -> FlexibilizationHistoryResponse:
+        resposta = self.__session.get(
+            f"{self.url}/flex/history/{encode_case(case)}",
+            timeout=self.timeout,
+        )
+        return FlexibilizationHistoryResponse(
+            **self.__resposta(case, resposta)
+        )
+
+    def flex_many(
+        self,
+        cases: Sequence[str],
+        rules: Optional[Iterable[Regra]] = None,
+        concurrency: Optional[int] = None,
+        **kwargs,
+    ) -> List[Resultado]:
+        """
+        Flexibilizes several cases, with at most `concurrency` requests
+        in flight. Returns, in the order of the cases, the response or
+        the FlexibilizationError of each one.
+        """
+        regras = list(rules or [])
+
+        def __executa(case: str) -> Resultado:
+            try:
+                return self.flex(case, regras, **kwargs)
+            except FlexibilizationError as e:
+                return e
+
+        with ThreadPoolExecutor(concurrency or self.pool_size) as executor:
+            return list(executor.map(__executa, cases))
+
+
+class AsyncFlexClient:
+    """
+    Asynchronous (aiohttp) client for the flexibilizador-service, which
+    keeps a pool of keep-alive connections to the service.
+    """
+
+    def __init__(
+        self,
+        url: str = "http://localhost:5052",
+        program: str = "DECOMP",
+        pool_size: int = 8,
+        timeout: Optional[float] = 300.0,
+    ):
+        self.url = url.rstrip("/")
+        self.program = program
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.__session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncFlexClient":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __sessao(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self.__session
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def __resposta(
+        self, case: str, resposta: aiohttp.ClientResponse
+    ) -> dict:
+        if resposta.status >= 400:
+            try:
+                conteudo = await resposta.json(content_type=None)
+            except ValueError:
+                conteudo = await resposta.text()
+            raise _erro(case, resposta.status, conteudo)
+        return await resposta.json(content_type=None)
+
+    async def flex(
+        self,
+        case: str,
+        rules: Optional[Iterable[Regra]] = None,
+        dry_run: bool = False,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+    ) -> FlexibilizationResponse:
+        corpo = _corpo(case, rules, self.program, dry_run, timeout, priority)
+        async with self.__sessao().post(
+            f"{self.url}/flex/", json=corpo
+        ) as resposta:
+            conteudo = await self.__resposta(case, resposta)
+        return FlexibilizationResponse(**conteudo)
+
+    async def dry_run(
+        self, case: str, rules: Optional[Iterable[Regra]] = None, **kwargs
+    ) -> FlexibilizationResponse:
+        return await self.flex(case, rules, dry_run=True, **kwargs)
+
+    async def history(self, case: str) -> FlexibilizationHistoryResponse:
+        async with self.__sessao().get(
+            f"{self.url}/flex/history/{encode_case(case)}"
+        ) as resposta:
+            conteudo = await self.__resposta(case, resposta)
+        return FlexibilizationHistoryResponse(**conteudo)
+
+    async def flex_many(
+        self,
+        cases: Sequence[str],
+        rules: Optional[Iterable[Regra]] = None,
+        concurrency: Optional[int] = None,
+        **kwargs,
+    ) -> List[Resultado]:
+        """
+        Flexibilizes several cases, with at most `concurrency` requests
+        in flight. Returns, in the order of the cases, the response or
+        the FlexibilizationError of each one.
+        """
+        regras = list(rules or [])
+        semaforo = asyncio.Semaphore(concurrency or self.pool_size)
+
+        async def __executa(case: str) -> Resultado:
+            async with semaforo:
+                try:
+                    return await self.flex(case, regras, **kwargs)
+                except FlexibilizationError as e:
+                    return e
+
+        return list(await asyncio.gather(*[__executa(c) for c in cases]))
@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import aiohttp
+import base62  # type: ignore
+import numpy as np
+
+PERCENTIS = [50, 95, 99]
+
+
+class Amostra(NamedTuple):
+    inicio: float
+    latencia: float
+    status: int
+    erro: Optional[str]
+
+
+def prepara_casos(modelo: str, num_casos: int, destino: str) -> List[str]:
+    """
+    Generates `num_casos` independent copies of a template case, so that
+    concurrent requests do not contend for the same case lock.
+    """
+    casos = []
+    for i in range(num_casos):
+        caso = os.path.join(destino, f"caso_{i:04d}")
+        shutil.copytree(modelo, caso)
+        casos.append(caso)
+    return casos
+
+
+def corpo_requisicao(
+    caso: str, programa: str, dry_run: bool, regras: list
+) -> dict:
+    return {
+        "id": base62.encodebytes(os.path.abspath(caso).encode("utf-8")),
+        "program": programa,
+        "rules": regras,
+        "dryRun": dry_run,
+    }
+
+
+async def requisicao(
+    sessao: aiohttp.ClientSession,
+    url: str,
+    corpo: dict,
+    amostras: List[Amostra],
+):
+    inicio = time.monotonic()
+    try:
+        async with sessao.post(url, json=corpo) as resposta:
+            await resposta.read()
+            status = resposta.status
+            erro = None if status < 400 else resposta.reason
+    except Exception as e:
+        status = 0
+        erro = f"{type(e).__name__}: {e}"
+    amostras.append(Amostra(inicio, time.monotonic() - inicio, status, erro))
+
+
+async def executa_concorrencia(
+    sessao: aiohttp.ClientSession,
+    url: str,
+    corpos: List[dict],
+    concorrencia: int,
+    duracao: float,
+    total: Optional[int],
+) -> List[Amostra]:
+    """
+    Closed-loop load: `concorrencia` workers issue requests back to back
+    until the duration (or the total number of requests) is reached.
+    """
+    amostras: List[Amostra] = []
+    fim = time.monotonic() + duracao
+    contador = iter(range(sys.maxsize if total is None else total))
+
+    async def trabalhador():
+        for n in contador:
+            if time.monotonic() >= fim:
+                return
+            corpo = corpos[n % len(corpos)]
+            await requisicao(sessao, url, corpo, amostras)
+
+    await asyncio.gather(*[trabalhador() for _ in range(concorrencia)])
+    return amostras
+
+
+async def executa_taxa(
+    sessao: aiohttp.ClientSession,
+    url: str,
+    corpos: List[dict],
+    taxa: float,
+    duracao: float,
+    total: Optional[int],
+) -> List[Amostra]:
+    """
+    Open-loop load: requests are issued at a fixed rate, regardless of
+    the response times, so that queueing in the service is visible.
+    """
+    amostras: List[Amostra] = []
+    tarefas = []
+    inicio = time.monotonic()
+    n = 0
+    while total is None or n < total:
+        agendado = inicio + n / taxa
+        if agendado - inicio >= duracao:
+            break
+        espera = agendado - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        corpo = corpos[n % len(corpos)]
+        tarefas.append(
+            asyncio.create_task(requisicao(sessao, url, corpo, amostras))
+        )
+        n += 1
+    await asyncio.gather(*tarefas)
+    return amostras
+
+
+def resume(amostras: List[Amostra], duracao: float) -> dict:
+    """
+    Summarizes the samples as throughput, latency percentiles (in
+    seconds) and error rates.
+    """
+    latencias = np.array([a.latencia for a in amostras], dtype=np.float64)
+    erros = [a for a in amostras if a.erro is not None]
+    status: Dict[str, int] = {}
+    for a in amostras:
+        status[str(a.status)] = status.get(str(a.status), 0) + 1
+    latencia = {"mean": 0.0, "max": 0.0}
+    latencia.update({f"p{p}": 0.0 for p in PERCENTIS})
+    if len(latencias) > 0:
+        latencia["mean"] = float(latencias.mean())
+        latencia["max"] = float(latencias.max())
+        for p, v in zip(PERCENTIS, np.percentile(latencias, PERCENTIS)):
+            latencia[f"p{p}"] = float(v)
+    return {
+        "requests": len(amostras),
+        "duration": duracao,
+        "throughput": len(amostras) / duracao if duracao > 0 else 0.0,
+        "errors": len(erros),
+        "error_rate": len(erros) / len(amostras) if amostras else 0.0,
+        "status": status,
+        "latency": latencia,
+    }
+
+
+def compara(atual: dict, base: dict) -> dict:
+    """
+    Relative change of the main indicators with respect to a baseline
+    report (positive values mean an increase).
+    """
+
+    def __variacao(a: float, b: float) -> Optional[float]:
+        return None if b == 0 else (a - b) / b
+
+    variacoes = {
+        "throughput": __variacao(atual["throughput"], base["throughput"]),
+        "error_rate": atual["error_rate"] - base["error_rate"],
+    }
+    for chave in ["mean"] + [f"p{p}" for p in PERCENTIS]:
+        variacoes[f"latency_{chave}"] = __variacao(
+            atual["latency"][chave], base["latency"][chave]
+        )
+    return variacoes
+
+
+async def executa(args: argparse.Namespace) -> dict:
+    regras = []
+    if args.rules:
+        with open(args.rules, "r") as arq:
+            regras = json.load(arq)
+    with tempfile.TemporaryDirectory(dir=args.workdir) as diretorio:
+        if args.keep_case:
+            casos = [args.case]
+        else:
+            casos = prepara_casos(args.case, args.cases, diretorio)
+        corpos = [
+            corpo_requisicao(c, args.program, args.dry_run, regras)
+            for c in casos
+        ]
+        url = args.url.rstrip("/") + args.endpoint
+        limite = aiohttp.TCPConnector(limit=0)
+        tempo_limite = aiohttp.ClientTimeout(total=args.timeout)
+        async with aiohttp.ClientSession(
+            connector=limite, timeout=tempo_limite
+        ) as sessao:
+            inicio = time.monotonic()
+            if args.rate:
+                amostras = await executa_taxa(
+                    sessao, url, corpos, args.rate, args.duration, args.total
+                )
+            else:
+                amostras = await executa_concorrencia(
+                    sessao,
+                    url,
+                    corpos,
+                    args.concurrency,
+                    args.duration,
+                    args.total,
+                )
+            duracao = time.monotonic() - inicio
+    relatorio = resume(amostras, duracao)
+    relatorio["config"] = {
+        "url": url,
+        "mode": "rate" if args.rate else "concurrency",
+        "rate": args.rate,
+        "concurrency": args.concurrency,
+        "cases": len(casos),
+        "dry_run": args.dry_run,
+        "label": args.label,
+    }
+    return relatorio
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Gerador de carga para o flexibilizador-service"
+    )
+    parser.add_argument("case", help="diretório do caso modelo (DECOMP)")
+    parser.add_argument("--url", default="http://localhost:5052")
+    parser.add_argument("--endpoint", default="/flex/")
+    parser.add_argument("--program", default="DECOMP")
+    parser.add_argument("--rules", help="arquivo JSON com as regras")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--cases", type=int, default=8, help="cópias do caso modelo"
+    )
+    parser.add_argument(
+        "--keep-case",
+        action="store_true",
+        help="usa o próprio caso modelo em todas as requisições",
+    )
+    parser.add_argument("--workdir", help="diretório para as cópias")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--rate", type=float, help="requisições por segundo (malha aberta)"
+    )
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--total", type=int, help="número de requisições")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--label", default="")
+    parser.add_argument("--output", help="arquivo JSON para o relatório")
+    parser.add_argument(
+        "--baseline", help="relatório JSON anterior para comparação"
+    )
+    args = parser.parse_args(argv)
+    # Com menos cópias que trabalhadores, requisições simultâneas
+    # disputariam o lock do mesmo caso
+    if not args.rate and not args.keep_case and args.concurrency > args.cases:
+        parser.error(
+            f"--concurrency ({args.concurrency}) maior que --cases"
+            + f" ({args.cases}); use --keep-case para disputar o mesmo caso"
+        )
+    return args
+
+
+def main(argv: List[str]) -> int:
+    args = parse_args(argv)
+    relatorio = asyncio.run(executa(args))
+    if args.baseline:
+        with open(args.baseline, "r") as arq:
+            relatorio["comparison"] = compara(relatorio, json.load(arq))
+    conteudo = json.dumps(relatorio, indent=2)
+    if args.output:
+        with open(args.output, "w") as arq:
+            arq.write(conteudo)
+    print(conteudo)
+    return 0 if relatorio["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -3,8 +3,13 @@ import uvicorn
 import os
 import pathlib
 from fastapi import FastAPI
-from app.routers import flex
+from app.routers import debug, flex, metrics
 from app.internal.settings import Settings
+from app.internal.callback import CallbackDispatcher
+from app.internal.loopmonitor import LoopMonitor
+from app.internal.profiler import SamplingProfiler
+from app.internal.requestid import RequestIdMiddleware
+from app.services.watcher import factory as watcher_factory
 from app.utils.log import Log
 
 BASEDIR = pathlib.Path().resolve()
@@ -17,7 +22,33 @@ Settings.read_environments()
 
 app = FastAPI(root_path=Settings.root_path)
 
+app.add_middleware(RequestIdMiddleware)
 app.include_router(flex.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+
+watcher = watcher_factory()
+loop_monitor = LoopMonitor(
+    Settings.loop_lag_interval, Settings.loop_block_threshold
+)
+
+
+@app.on_event("startup")
+async def startup():
+    loop_monitor.start()
+    SamplingProfiler().start()
+    if watcher is not None:
+        watcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await loop_monitor.stop()
+    SamplingProfiler().stop()
+    await CallbackDispatcher().close()
+    if watcher is not None:
+        await watcher.stop()
+
 
 if __name__ == "__main__":
     Log.configure_logging(BASEDIR)
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import socket
+
+import pytest
+from aiohttp import web
+
+from app.internal.callback import CallbackDispatcher, valid_callback_url
+from app.internal.settings import Settings
+from app.utils.log import Log
+from app.utils.singleton import Singleton
+
+
+@pytest.fixture(autouse=True)
+def dispatcher(monkeypatch):
+    Log.LOGGER = logging.getLogger("tests")
+    monkeypatch.setattr(Settings, "callback_retries", 3)
+    monkeypatch.setattr(Settings, "callback_backoff", 0.01)
+    monkeypatch.setattr(Settings, "callback_timeout", 5.0)
+    Singleton._instances.pop(CallbackDispatcher, None)
+    yield
+    Singleton._instances.pop(CallbackDispatcher, None)
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _envia(respostas: list, rota: str = "/resultado"):
+    """
+    Starts a local server that answers the callbacks with the given
+    statuses (the last one repeated), and sends one result to it.
+    """
+    recebidos = []
+
+    async def recebe(request: web.Request) -> web.Response:
+        recebidos.append(await request.read())
+        status = respostas[min(len(recebidos), len(respostas)) - 1]
+        return web.Response(status=status)
+
+    app = web.Application()
+    app.router.add_post(rota, recebe)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    porta = _porta_livre()
+    await web.TCPSite(runner, "127.0.0.1", porta).start()
+    try:
+        entregue = await CallbackDispatcher().send(
+            f"http://127.0.0.1:{porta}{rota}", b'{"result": []}'
+        )
+    finally:
+        await CallbackDispatcher().close()
+        await runner.cleanup()
+    return entregue, recebidos
+
+
+def test_retenta_respostas_503():
+    entregue, recebidos = asyncio.run(_envia([503, 503, 200]))
+    assert entregue
+    assert len(recebidos) == 3
+    assert all(r == b'{"result": []}' for r in recebidos)
+
+
+def test_desiste_apos_as_tentativas():
+    entregue, recebidos = asyncio.run(_envia([503]))
+    assert not entregue
+    assert len(recebidos) == Settings.callback_retries + 1
+
+
+def test_nao_retenta_resposta_404():
+    entregue, recebidos = asyncio.run(_envia([404, 200]))
+    assert not entregue
+    assert len(recebidos) == 1
+
+
+def test_desiste_com_conexao_recusada():
+    async def envia() -> bool:
+        try:
+            return await CallbackDispatcher().send(
+                f"http://127.0.0.1:{_porta_livre()}/resultado", b"{}"
+            )
+        finally:
+            await CallbackDispatcher().close()
+
+    assert not asyncio.run(envia())
+
+
+@pytest.mark.parametrize(
+    "url, valida",
+    [
+        ("http://localhost:8080/resultado", True),
+        ("https://exemplo.com/callback?id=1", True),
+        ("file:///etc/passwd", False),
+        ("ftp://exemplo.com/resultado", False),
+        ("/resultado", False),
+        ("http:///resultado", False),
+    ],
+)
+def test_valida_url_de_callback(url: str, valida: bool):
+    assert valid_callback_url(url) == valida
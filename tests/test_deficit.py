@@ -0,0 +1,73 @@
+import logging
+from copy import deepcopy
+
+import pandas as pd
+import pytest
+from idecomp.decomp import Dadger
+
+from app.adapters.rulesrepository import compile_rules
+from app.adapters.violationrepository import AbsoluteViolationRepository
+from app.models.flexibilizationrule import FlexibilizationRule
+from app.models.inviabilidade import InviabilidadeDeficit
+from app.utils.log import Log
+
+DADGER = (
+    "CM    1    1        1.00\n"
+    + "CM    2    2        1.00\n"
+    + "HE    1  2         50.00  1    1000.00     1             \n"
+)
+
+
+class Relato:
+    dados_mercado = pd.DataFrame(
+        {
+            "estagio": [1, 1],
+            "nome_submercado": ["SE", "S"],
+            "duracao_patamar_1": [10.0, 10.0],
+            "duracao_patamar_2": [10.0, 10.0],
+        }
+    )
+    energia_armazenada_maxima_submercado = pd.DataFrame(
+        {
+            "nome_submercado": ["SE", "S"],
+            "energia_armazenada_maxima": [1000.0, 1000.0],
+        }
+    )
+
+
+@pytest.fixture
+def dadger(tmp_path) -> Dadger:
+    Log.LOGGER = logging.getLogger("tests")
+    caminho = tmp_path / "dadger.rv0"
+    caminho.write_text(DADGER)
+    return Dadger.read(str(caminho))
+
+
+def _deficit(patamar: int, violacao: float) -> InviabilidadeDeficit:
+    return InviabilidadeDeficit(
+        1,
+        1,
+        1,
+        f"DEFICIT SUBSISTEMA SE, PATAMAR {patamar}",
+        violacao,
+        "MW",
+        Relato(),
+    )
+
+
+def test_variantes_com_mesmas_regras_flexibilizam_igualmente(dadger):
+    # As variantes recebem a mesma lista de inviabilidades e cada uma a
+    # sua cópia do dadger
+    inviabilidades = [_deficit(1, 100.0), _deficit(2, 60.0)]
+    regras = [FlexibilizationRule(violationType="DEFICIT")]
+    resultados = []
+    limites = []
+    for _ in range(2):
+        repo = AbsoluteViolationRepository(compile_rules(regras))
+        copia = deepcopy(dadger)
+        resultados.append(repo.flexibilize(copia, inviabilidades))
+        limites.append(copia.he(codigo_restricao=1, estagio=1).limite)
+    assert len(resultados[0]) == 1
+    assert resultados[0] == resultados[1]
+    assert limites[0] == limites[1] < 50.0
+    assert [i._violacao_percentual for i in inviabilidades] == [5.0, 3.0]
@@ -0,0 +1,48 @@
+from app.adapters.rulesrepository import compile_rules
+from app.models.flexibilizationrule import FlexibilizationRule
+
+
+def test_regra_por_familia_e_codigo():
+    regras = compile_rules(
+        [
+            FlexibilizationRule(violationType="RE", flexibilizationFactor=2),
+            FlexibilizationRule(
+                violationType="re", violationCode=10, flexibilizationDelta=5
+            ),
+        ]
+    )
+    assert regras.apply("RE", 10, None, 1.0, 3.0) == 6.0
+    assert regras.apply("RE", 11, None, 1.0, 3.0) == 5.0
+    assert regras.apply("HE", 10, None, 1.0, 3.0) == 4.0
+
+
+def test_regra_sem_familia_casa_codigo_de_qualquer_familia():
+    regras = compile_rules(
+        [FlexibilizationRule(violationCode=10, flexibilizationSkip=True)]
+    )
+    assert regras.skip("RE", 10, None)
+    assert regras.skip("HE", 10, "MW")
+    assert not regras.skip("RE", 11, None)
+
+
+def test_regra_sem_familia_com_unidade():
+    regras = compile_rules(
+        [
+            FlexibilizationRule(
+                violationCode=10, violationUnit="MW", flexibilizationCap=2
+            )
+        ]
+    )
+    assert regras.apply("RE", 10, "MW", 5.0, 1.0) == 2.0
+    assert regras.apply("RE", 10, "%", 5.0, 1.0) == 6.0
+
+
+def test_regra_da_familia_prevalece_sobre_regra_do_codigo():
+    regras = compile_rules(
+        [
+            FlexibilizationRule(violationCode=10, flexibilizationSkip=True),
+            FlexibilizationRule(violationType="RE", flexibilizationSkip=False),
+        ]
+    )
+    assert not regras.skip("RE", 10, None)
+    assert regras.skip("HE", 10, None)